@@ -0,0 +1,65 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from logging.handlers import RotatingFileHandler
+
+from app_paths import data_dir
+
+# Status types mapped to logging levels for the log file
+_LOGGING_LEVELS = {"info": logging.INFO, "success": logging.INFO, "warning": logging.WARNING,
+                   "error": logging.ERROR}
+
+
+def default_log_path():
+    return data_dir("logs", "activity.log")
+
+
+def file_logger(path=None, max_bytes=5 * 1024 * 1024, backup_count=5):
+    """Return the logger writing every activity entry to a rotating file."""
+    path = path or default_log_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    logger = logging.getLogger("whatsapp_sender.activity")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if not any(getattr(h, "baseFilename", None) == os.path.abspath(path) for h in logger.handlers):
+        handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(status)-7s %(message)s"))
+        logger.addHandler(handler)
+    return logger
+
+
+class LogBuffer:
+    """Keeps the last capacity activity entries for display and streams all of them to the log file.
+
+    add() is O(1) and safe from any thread; the view polls version to know when to redraw,
+    so the cost of showing the log does not grow with the number of entries.
+    """
+
+    def __init__(self, capacity=5000, logger=None):
+        self.entries = deque(maxlen=capacity)  # (timestamp, status_type, message)
+        self.logger = logger
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def add(self, message, status_type="info"):
+        entry = (time.time(), status_type, message)
+        with self._lock:
+            self.entries.append(entry)
+            self.version += 1
+        if self.logger:
+            self.logger.log(_LOGGING_LEVELS.get(status_type, logging.INFO), message, extra={"status": status_type})
+
+    def snapshot(self, levels=None):
+        """Return (version, entries), keeping only the given status types when levels is set."""
+        with self._lock:
+            version, entries = self.version, list(self.entries)
+        if levels:
+            entries = [entry for entry in entries if entry[1] in levels]
+        return version, entries
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.version += 1
@@ -1,19 +1,24 @@
+import time
+STARTED_AT = time.perf_counter()  # Measures how long the window takes to show up
 import sys
 import os
-import pandas as pd
-import time
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from urllib.parse import quote
+import threading
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QPushButton, QFileDialog, QProgressBar, QTextEdit,
-                            QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox, QLineEdit,
-                            QFrame, QScrollArea , QTabWidget, QSizePolicy, QGroupBox, QSpacerItem)
+                            QTableView, QTableWidget, QTableWidgetItem, QListView, QHeaderView, QMessageBox, QLineEdit, QComboBox,
+                            QFrame, QScrollArea , QTabWidget, QSizePolicy, QGroupBox, QSpacerItem, QCheckBox)
 from PyQt5.QtGui import QPixmap, QIcon, QFont, QColor, QPalette, QFontDatabase, QDrag, QIntValidator
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QSize, QUrl, QMimeData
-import requests
+from PyQt5.QtCore import (Qt, QThread, pyqtSignal, QSize, QUrl, QMimeData, QAbstractTableModel,
+                          QAbstractListModel, QModelIndex, QTimer)
+from contacts import ContactStore, SUPPORTED_EXTENSIONS, read_table
+from phone_numbers import normalize_numbers, summarize
+from message_template import compile_template, render_messages
+from campaign_journal import CampaignJournal
+from send_history import SendHistory
+from activity_log import LogBuffer, file_logger
+from campaign_runner import CampaignRunner
+from app_paths import data_dir
+# pandas, selenium and requests are imported where they are first needed, so the window shows up fast
 
 # Define brand colors with adjusted shades
 PRIMARY_COLOR = "#1976D2"  # Deeper blue
@@ -24,120 +29,251 @@ SUCCESS_COLOR = "#4CAF50"  # Success green
 WARNING_COLOR = "#FF9800"  # Warning orange
 ERROR_COLOR = "#F44336"  # Error red
 CARD_SHADOW = "rgba(0, 0, 0, 0.1)"  # Shadow color for cards
+LOGO_URL = "https://deermedia.co/wp-content/uploads/2020/06/%D8%A7%D9%84%D8%BA%D8%B2%D8%A7%D9%84-.png"
+LOGO_MAX_AGE = 7 * 24 * 3600  # Seconds before the cached logo is downloaded again
+
+# Metrics tab columns: header, summary key, factor from seconds
+METRICS_COLUMNS = [("Phase", "phase", None), ("Count", "count", None), ("Mean ms", "mean", 1000),
+                   ("p50 ms", "p50", 1000), ("p90 ms", "p90", 1000), ("p99 ms", "p99", 1000),
+                   ("Max ms", "max", 1000), ("Total s", "total", 1)]
+
 
 class WhatsAppSender(QThread):
-    update_progress = pyqtSignal(int, str, str)  # Added status type parameter
+    """Runs a CampaignRunner off the GUI thread; the window polls its progress channel."""
     finished = pyqtSignal(bool, str)
 
-    def __init__(self, excel_file, delay, parent=None):
+    def __init__(self, excel_file, delay, contact_store=None, template=None, country_code="",
+                 sessions=None, send_mode="navigate", per_minute=None, per_hour=None, journal=None,
+                 resume=True, history=None, skip_recent_days=None, attachment=None, send_as_document=False,
+                 engine="selenium", prefetch=0, parent=None):
         super().__init__(parent)
-        self.excel_file = excel_file
-        self.delay = delay
-        # Default column names
-        self.message_column = "Message"
-        self.name_column = "Customers Name"
-        self.number_column = "Whatsapp Number"
-        self.is_running = True
+        self.runner = CampaignRunner(excel_file, delay, contact_store, template, country_code, sessions,
+                                     send_mode, per_minute, per_hour, journal, resume, history, skip_recent_days,
+                                     attachment=attachment, send_as_document=send_as_document, engine=engine,
+                                     prefetch=prefetch)
+        self.progress = self.runner.progress
+        self.metrics = self.runner.metrics
 
     def stop(self):
-        self.is_running = False
+        self.runner.stop()
+
+    @staticmethod
+    def progress_percent(index, total_count):
+        if not total_count:
+            return 0
+        return min(int((index + 1) / total_count * 100), 99)
 
     def run(self):
-        try:
-            # Read Excel file
-            df = pd.read_excel(self.excel_file)
-            if df[self.number_column].dtype != 'object':
-                df[self.number_column] = df[self.number_column].astype(str)
-            df[self.number_column] = df[self.number_column].str.replace(r'\D+', '', regex=True)  # Clean numbers
-            
-            # Step 1: Open browser in visible mode for QR code scanning
-            chrome_profile_path = os.path.join(os.environ['USERPROFILE'], 'AppData', 'Local', 'Google', 'Chrome', 'User Data', 'Default')
-            options = webdriver.ChromeOptions()
-            options.add_argument(f'user-data-dir={chrome_profile_path}')
-            driver = webdriver.Chrome(options=options)
-            driver.get('https://web.whatsapp.com/')
-            
-            try:
-                # Check if the user is logged in
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_element_located((By.XPATH, '//div[@role="textbox"][@contenteditable="true"]'))
-                )
-                self.update_progress.emit(0, "Logged into WhatsApp Web successfully.", "success")
-            except Exception:
-                # If not logged in, wait for QR code scan
-                self.update_progress.emit(0, "Please scan the QR code to log in.", "info")
-                try:
-                    WebDriverWait(driver, 60).until(
-                        EC.presence_of_element_located((By.XPATH, '//div[@role="textbox"][@contenteditable="true"]'))
-                    )
-                    self.update_progress.emit(0, "Logged into WhatsApp Web successfully.", "success")
-                except Exception as e:
-                    driver.quit()
-                    self.finished.emit(False, f"Failed to log in: {str(e)}")
-                    return
-            
-            # Step 2: Close the visible browser and reopen in headless mode
-            driver.quit()
-            options.add_argument('--headless')  # Enable headless mode
-            options.add_argument('--disable-gpu')
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            driver = webdriver.Chrome(options=options)
-            
-            total_count = len(df)
-            success_count = 0
-            
-            for index, row in df.iterrows():
-                if not self.is_running:
-                    driver.quit()
-                    self.finished.emit(False, "Process was stopped by user")
-                    return
-                
-                try:
-                    # Define name and number before using them
-                    name = row[self.name_column]
-                    number = row[self.number_column]
-                    message = str(row[self.message_column]).replace('{name}', name)
-                    
-                    # Generate WhatsApp URL
-                    url = f'https://web.whatsapp.com/send?phone={number}&text={quote(message)}'
-                    driver.get(url)
-                    
-                    # Wait for the message input box to load
-                    try:
-                        WebDriverWait(driver, 15).until(
-                            EC.presence_of_element_located((By.XPATH, '//div[@role="textbox"][@contenteditable="true"]'))
-                        )
-                        
-                        # Click send button
-                        send_button = WebDriverWait(driver, 15).until(
-                            EC.element_to_be_clickable((By.XPATH, '//span[@data-icon="send"]'))
-                        )
-                        send_button.click()
-                        
-                        success_count += 1
-                        status_msg = f"Sent to {name} ({number})"
-                        status_type = "success"
-                    except Exception as e:
-                        status_msg = f"Failed to send to {name} ({number}): {str(e)}"
-                        status_type = "error"
-                    
-                    progress_percent = int((index + 1) / total_count * 100)
-                    self.update_progress.emit(progress_percent, status_msg, status_type)
-                    time.sleep(self.delay)  # Wait between messages
-                    
-                except Exception as e:
-                    self.update_progress.emit(
-                        int((index + 1) / total_count * 100), 
-                        f"Error processing {name} ({number}): {str(e)}",
-                        "error"
-                    )
-            time.sleep(1)  
-            driver.quit()
-            self.finished.emit(True, f"Completed sending messages. Success: {success_count}/{total_count}")
-            
-        except Exception as e:
-            self.finished.emit(False, f"Process failed: {str(e)}")
+        result = self.runner.run()
+        self.finished.emit(result.success, result.message)
+
+
+class TableQuery(QThread):
+    """Sorts and filters the contact table off the GUI thread and hands back the row order.
+
+    The message column is searched and sorted as rendered; render builds it the first time a
+    query needs it, and it is handed back with the order so later queries reuse it.
+    """
+    done = pyqtSignal(int, object, object)
+
+    def __init__(self, generation, columns, statuses, row_labels, text, status_filter, sort_column, descending,
+                 render=None, parent=None):
+        super().__init__(parent)
+        self.generation = generation
+        self.columns = list(columns)  # numpy arrays of the displayed columns, None for messages not rendered yet
+        self.render = render
+        self.statuses = statuses
+        self.row_labels = row_labels
+        self.text = text
+        self.status_filter = status_filter
+        self.sort_column = sort_column
+        self.descending = descending
+
+    def status_array(self):
+        import numpy as np
+        return np.array([self.statuses.get(row, "") for row in self.row_labels], dtype=object)
+
+    def run(self):
+        import numpy as np
+        import pandas as pd
+        
+        if self.sort_column is not None and self.sort_column < 0:
+            self.sort_column = None  # Qt's "no sort column": keep the sheet's order
+        if self.columns[2] is None and (self.text or self.sort_column == 2):
+            self.columns[2] = self.render().to_numpy()
+        mask = np.ones(len(self.row_labels), dtype=bool)
+        if self.text:
+            # Match any of the displayed columns, case-insensitively
+            found = np.zeros(len(self.row_labels), dtype=bool)
+            for values in self.columns:
+                if values is None:
+                    continue
+                found |= pd.Series(values).str.contains(self.text, case=False, regex=False, na=False).to_numpy()
+            mask &= found
+        if self.status_filter:
+            statuses = self.status_array()
+            mask &= pd.Series(statuses).str.startswith(self.status_filter, na=False).to_numpy()
+        order = np.flatnonzero(mask)
+
+        if self.sort_column is not None:
+            if self.sort_column < len(self.columns):
+                keys = self.columns[self.sort_column][order]
+            else:
+                keys = self.status_array()[order]
+            keys = pd.Series(keys).str.lower().to_numpy()
+            order = order[np.argsort(keys, kind="stable")]
+            if self.descending:
+                order = order[::-1]
+        self.done.emit(self.generation, order, self.columns[2])
+
+
+class ContactTableModel(QAbstractTableModel):
+    """Read-only view of the whole cached contacts table.
+
+    Cells are computed in data() only for the rows on screen, straight from the table's column
+    arrays, so a 1M-row sheet costs one row-order array and no per-cell objects. Sorting and
+    filtering run in a TableQuery thread, on the messages as rendered (the whole column is
+    rendered the first time they are needed); per-row send status is kept by sheet row number.
+    """
+    HEADERS = ["Name", "Phone Number", "Message Preview", "Status"]
+    STATUS_COLORS = {"sent": SUCCESS_COLOR, "queued": WARNING_COLOR, "retrying": WARNING_COLOR,
+                     "failed": ERROR_COLOR, "invalid": ERROR_COLOR, "skipped": WARNING_COLOR}
+    MESSAGE_CACHE_SIZE = 2000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.df = None
+        self.columns = []  # name, number and message arrays
+        self.row_values = []  # every sheet column, to render the template per row
+        self.row_labels = []
+        self.order = []
+        self.statuses = {}
+        self.template = None
+        self.message_column = "Message"
+        self.bound_templates = {}
+        self.messages = {}
+        self.rendered = None  # Every row's message, once a sort or filter needed them
+        self.sort_column = None
+        self.descending = False
+        self.filter_text = ""
+        self.status_filter = ""
+        self.generation = 0
+        self.queries = []
+
+    def set_table(self, df, name_column, number_column, message_column, template=None, statuses=None):
+        import numpy as np
+        
+        self.beginResetModel()
+        self.generation += 1  # Queries still running on the old table must not reorder this one
+        self.df = df
+        self.message_column = message_column
+        self.columns = [df[col].to_numpy() for col in (name_column, number_column, message_column)]
+        self.row_values = [df[col].to_numpy() for col in df.columns]
+        self.row_labels = df.index.to_numpy()
+        self.order = np.arange(len(df))
+        self.statuses = dict(statuses or {})
+        self.template = template or None
+        self.bound_templates = {}
+        self.messages = {}
+        self.rendered = None
+        self.endResetModel()
+        if self.sort_column is not None or self.filter_text or self.status_filter:
+            self.refresh()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        if section < len(self.order):
+            return str(self.row_labels[self.order[section]])
+        return None
+
+    def message(self, pos):
+        if self.rendered is not None:
+            return self.rendered[pos]
+        message = self.messages.get(pos)
+        if message is None:
+            text = self.template or self.columns[2][pos]
+            bound = self.bound_templates.get(text)
+            if bound is None:
+                bound = self.bound_templates[text] = compile_template(text).bind(list(self.df.columns))
+            message = bound.render(tuple(values[pos] for values in self.row_values))
+            if len(self.messages) >= self.MESSAGE_CACHE_SIZE:
+                self.messages.clear()
+            self.messages[pos] = message
+        return message
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        pos = self.order[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 2:
+                return self.message(pos).replace("\n", " ")
+            if column == 3:
+                return self.statuses.get(self.row_labels[pos], "")
+            return str(self.columns[column][pos])
+        if role == Qt.ToolTipRole and column == 2:
+            return self.message(pos)
+        if role == Qt.ForegroundRole and column == 3:
+            status = self.statuses.get(self.row_labels[pos], "")
+            color = self.STATUS_COLORS.get(status.split(":")[0])
+            return QColor(color) if color else None
+        return None
+
+    def set_status(self, rows, status):
+        """Set the status of the given sheet rows and repaint the status column."""
+        for row in rows:
+            self.statuses[row] = status
+        if len(self.order):
+            self.dataChanged.emit(self.index(0, 3), self.index(len(self.order) - 1, 3), [Qt.DisplayRole])
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Column -1 is Qt's way of asking for the natural order back
+        self.sort_column = column if column >= 0 else None
+        self.descending = order == Qt.DescendingOrder
+        self.refresh()
+
+    def set_filter(self, text, status_filter=""):
+        self.filter_text = text
+        self.status_filter = status_filter
+        self.refresh()
+
+    def refresh(self):
+        """Run the current sort and filter in the background; stale results are dropped."""
+        if self.df is None:
+            return
+        self.generation += 1
+        df, template, message_column = self.df, self.template, self.message_column
+        query = TableQuery(self.generation, [self.columns[0], self.columns[1], self.rendered], dict(self.statuses),
+                           self.row_labels, self.filter_text, self.status_filter, self.sort_column, self.descending,
+                           lambda: render_messages(df, template, message_column), self)
+        query.done.connect(self.apply_order)
+        query.finished.connect(lambda: self.queries.remove(query))
+        self.queries.append(query)
+        query.start()
+
+    def apply_order(self, generation, order, rendered):
+        if generation != self.generation:
+            return
+        self.beginResetModel()
+        self.order = order
+        if rendered is not None:
+            self.rendered = rendered
+        self.endResetModel()
+
+    def wait(self):
+        for query in list(self.queries):
+            query.wait()
+
 class StyleSheet:
     @staticmethod
     def get_stylesheet():
@@ -243,7 +379,7 @@ class StyleSheet:
         }}
 
         /* Table - Clean Data Grid */
-        QTableWidget {{
+        QTableView {{
             border: none;
             background: white;
             alternate-background-color: #F8FAFC;
@@ -257,7 +393,7 @@ class StyleSheet:
             font-weight: 500;
         }}
 
-        QTableWidget::item {{
+        QTableView::item {{
             padding: 8px;
             border-bottom: 1px solid #F1F5F9;
         }}
@@ -314,16 +450,59 @@ class StyleSheet:
         QLabel#StatusInfo {{ color: #2563EB; }}
         """
 
-class LogWidget(QWidget):
+class LogListModel(QAbstractListModel):
+    """Entries of the activity log currently on screen, replaced in one go on every refresh."""
+    COLORS = {"success": SUCCESS_COLOR, "warning": WARNING_COLOR, "error": ERROR_COLOR, "info": PRIMARY_COLOR}
+
     def __init__(self, parent=None):
+        super().__init__(parent)
+        self.entries = []
+
+    def set_entries(self, entries):
+        self.beginResetModel()
+        self.entries = entries
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.entries)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        timestamp, status_type, message = self.entries[index.row()]
+        if role == Qt.DisplayRole:
+            return f"[{time.strftime('%H:%M:%S', time.localtime(timestamp))}] {message}"
+        if role == Qt.ForegroundRole:
+            return QColor(self.COLORS.get(status_type, PRIMARY_COLOR))
+        return None
+
+
+class LogWidget(QWidget):
+    # The view catches up with the buffer at most this often
+    REFRESH_INTERVAL_MS = 100
+
+    def __init__(self, parent=None, capacity=5000):
         super().__init__(parent)
         layout = QVBoxLayout(self)
         
-        self.log_text = QTextEdit()
-        self.log_text.setReadOnly(True)
-        layout.addWidget(self.log_text)
+        self.buffer = LogBuffer(capacity, file_logger())
+        self.shown_version = 0
+        self.levels = None
+        
+        self.log_model = LogListModel(self)
+        self.log_view = QListView()
+        self.log_view.setModel(self.log_model)
+        self.log_view.setUniformItemSizes(True)
+        self.log_view.setWordWrap(False)
+        self.log_view.setSelectionMode(QListView.ExtendedSelection)
+        layout.addWidget(self.log_view)
         
         button_layout = QHBoxLayout()
+        button_layout.addWidget(QLabel("Show:"))
+        self.level_filter = QComboBox()
+        self.level_filter.addItems(["All", "Info", "Success", "Warning", "Error", "Warnings and Errors"])
+        self.level_filter.currentIndexChanged.connect(self.set_level_filter)
+        button_layout.addWidget(self.level_filter)
         button_layout.addStretch()
         
         self.clear_button = QPushButton("Clear Log")
@@ -332,23 +511,39 @@ class LogWidget(QWidget):
         button_layout.addWidget(self.clear_button)
         
         layout.addLayout(button_layout)
+        
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(self.REFRESH_INTERVAL_MS)
     
     def add_log_entry(self, message, status_type="info"):
-        color_map = {
-            "success": SUCCESS_COLOR,
-            "warning": WARNING_COLOR,
-            "error": ERROR_COLOR,
-            "info": PRIMARY_COLOR
-        }
-        
-        color = color_map.get(status_type, PRIMARY_COLOR)
-        timestamp = time.strftime("%H:%M:%S")
-        
-        self.log_text.append(f'<span style="color: gray;">[{timestamp}]</span> <span style="color: {color};">{message}</span>')
-        self.log_text.ensureCursorVisible()
+        # Only buffered here, the view picks it up on the next refresh
+        self.buffer.add(message, status_type)
+    
+    def set_level_filter(self):
+        text = self.level_filter.currentText()
+        if text == "All":
+            self.levels = None
+        elif text == "Warnings and Errors":
+            self.levels = ("warning", "error")
+        else:
+            self.levels = (text.lower(),)
+        self.shown_version = -1
+        self.refresh()
+    
+    def refresh(self):
+        if self.buffer.version == self.shown_version:
+            return
+        scrollbar = self.log_view.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum()
+        self.shown_version, entries = self.buffer.snapshot(self.levels)
+        self.log_model.set_entries(entries)
+        if at_bottom:
+            self.log_view.scrollToBottom()
     
     def clear_log(self):
-        self.log_text.clear()
+        self.buffer.clear()
+        self.refresh()
 
 
 class StatusBar(QWidget):
@@ -373,6 +568,9 @@ class StatusBar(QWidget):
         
         status_frame_layout.addStretch()
         
+        self.stats_label = QLabel()
+        status_frame_layout.addWidget(self.stats_label)
+        
         self.progress_bar = QProgressBar()
         self.progress_bar.setFixedWidth(200)
         self.progress_bar.setValue(0)
@@ -458,34 +656,45 @@ class FileDropArea(QFrame):
         urls = event.mimeData().urls()
         if urls and urls[0].toLocalFile():
             file_path = urls[0].toLocalFile()
-            if file_path.endswith(('.xlsx', '.xls')):  # Check for valid Excel file extensions
+            if file_path.lower().endswith(SUPPORTED_EXTENSIONS):  # Check for valid Excel/CSV file extensions
                 self.fileDropped.emit(file_path)  # Emit the file path
             else:
-                QMessageBox.warning(self, "Invalid File", "Please drop a valid Excel file.")
+                QMessageBox.warning(self, "Invalid File", "Please drop a valid Excel or CSV file.")
         self.setObjectName("DropArea")
         self.style().polish(self)  # Refresh the style
     
     def browse_file(self):
         file_path, _ = QFileDialog.getOpenFileName(
-            self, "Select Excel File", "", "Excel Files (*.xlsx *.xls)"
+            self, "Select Excel File", "", "Contact Files (*.xlsx *.xlsm *.xls *.csv)"
         )
         if file_path:
             self.fileDropped.emit(file_path)
 
 
 class MainWindow(QMainWindow):
+    logo_fetched = pyqtSignal(bytes)
+    logo_failed = pyqtSignal(str)
+
     def __init__(self):
         super().__init__()
         self.sender_thread = None
+        self.contact_store = ContactStore()
+        self.browser_sessions = []  # SessionManagers, created when sending starts
+        self.journal = CampaignJournal()
+        self.history = SendHistory()
+        # Progress of the running campaign is pulled at a fixed rate instead of pushed per contact
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(200)
+        self.progress_timer.timeout.connect(self.poll_progress)
         self.initUI()
         self.setWindowIcon(QIcon(".\\app.ico")) 
+        self.built_at = time.perf_counter()
     def initUI(self):
     
         self.setStyleSheet(StyleSheet.get_stylesheet())
         self.setWindowTitle("DeerMedia WhatsApp Sender")
         self.setWindowIcon(QIcon(".\\app.ico")) 
         self.setMinimumSize(1000, 800)
-        self.setStyleSheet(StyleSheet.get_stylesheet())
         
         # Main widget with vertical layout
         main_widget = QWidget()
@@ -505,22 +714,18 @@ class MainWindow(QMainWindow):
         header_layout = QHBoxLayout(header_frame)
         header_layout.setContentsMargins(15, 10, 15, 10)
         
-        # Logo and Title
-        logo_label = QLabel()
-        try:
-            logo_pixmap = QPixmap()
-            try:
-                response = requests.get("https://deermedia.co/wp-content/uploads/2020/06/%D8%A7%D9%84%D8%BA%D8%B2%D8%A7%D9%84-.png", timeout=10)
-                response.raise_for_status()  # Raise an HTTPError for bad responses
-                logo_pixmap.loadFromData(response.content)
-            except requests.exceptions.RequestException as e:
-                print(f"Error fetching logo image: {e}")
-                logo_label = QLabel("DeerMedia")
-                logo_label.setFont(QFont("Segoe UI", 16, QFont.Bold))
-            logo_label.setPixmap(logo_pixmap.scaledToHeight(60, Qt.SmoothTransformation))
-        except:
-            logo_label = QLabel("DeerMedia")
-            logo_label.setFont(QFont("Segoe UI", 16, QFont.Bold))
+        # Logo and Title, from the on-disk cache; a missing or old logo is fetched in the background
+        logo_label = self.logo_label = QLabel("DeerMedia")
+        logo_label.setFont(QFont("Segoe UI", 16, QFont.Bold))
+        logo_path = data_dir("logo.png")
+        if os.path.exists(logo_path):
+            with open(logo_path, "rb") as f:
+                self.set_logo(f.read())
+        if not os.path.exists(logo_path) or time.time() - os.path.getmtime(logo_path) > LOGO_MAX_AGE:
+            self.logo_fetched.connect(self.set_logo)
+            # Queued to the GUI thread, so the log widget exists by the time it arrives
+            self.logo_failed.connect(lambda message: self.log_widget.add_log_entry(message, "warning"))
+            threading.Thread(target=self.fetch_logo, args=(logo_path,), daemon=True).start()
         
         title_label = QLabel("WhatsApp Sender")
         title_label.setObjectName("HeaderTitle")
@@ -570,14 +775,76 @@ class MainWindow(QMainWindow):
         
         # Delay Input
         delay_layout = QHBoxLayout()
-        delay_layout.addWidget(QLabel("Delay Between Messages (seconds):"))
+        delay_layout.addWidget(QLabel("Min. Delay Between Messages (seconds):"))
         self.delay_input = QLineEdit("10")
         self.delay_input.setFixedWidth(80)
         self.delay_input.setValidator(QIntValidator(1, 300))
         delay_layout.addWidget(self.delay_input)
+        delay_layout.addSpacing(20)
+        delay_layout.addWidget(QLabel("Default Country Code:"))
+        self.country_code_input = QLineEdit()
+        self.country_code_input.setPlaceholderText("e.g. 966")
+        self.country_code_input.setFixedWidth(80)
+        self.country_code_input.setValidator(QIntValidator(1, 9999))
+        delay_layout.addWidget(self.country_code_input)
         delay_layout.addStretch()
         file_layout.addLayout(delay_layout)
         
+        limits_layout = QHBoxLayout()
+        limits_layout.addWidget(QLabel("Max Messages per Minute:"))
+        self.per_minute_input = QLineEdit()
+        self.per_minute_input.setPlaceholderText("No limit")
+        self.per_minute_input.setFixedWidth(80)
+        self.per_minute_input.setValidator(QIntValidator(1, 1000))
+        limits_layout.addWidget(self.per_minute_input)
+        limits_layout.addSpacing(20)
+        limits_layout.addWidget(QLabel("per Hour:"))
+        self.per_hour_input = QLineEdit()
+        self.per_hour_input.setPlaceholderText("No limit")
+        self.per_hour_input.setFixedWidth(80)
+        self.per_hour_input.setValidator(QIntValidator(1, 100000))
+        limits_layout.addWidget(self.per_hour_input)
+        limits_layout.addSpacing(20)
+        limits_layout.addWidget(QLabel("Skip Numbers Messaged Within (days):"))
+        self.skip_recent_input = QLineEdit()
+        self.skip_recent_input.setPlaceholderText("Off")
+        self.skip_recent_input.setFixedWidth(80)
+        self.skip_recent_input.setValidator(QIntValidator(1, 3650))
+        limits_layout.addWidget(self.skip_recent_input)
+        limits_layout.addStretch()
+        self.import_optout_btn = QPushButton("Import Opt-out List...")
+        self.import_optout_btn.clicked.connect(self.import_opt_outs)
+        limits_layout.addWidget(self.import_optout_btn)
+        file_layout.addLayout(limits_layout)
+        
+        sessions_layout = QHBoxLayout()
+        sessions_layout.addWidget(QLabel("Parallel WhatsApp Sessions:"))
+        self.sessions_input = QLineEdit("1")
+        self.sessions_input.setFixedWidth(80)
+        self.sessions_input.setValidator(QIntValidator(1, 8))
+        self.sessions_input.setToolTip("Each extra session uses its own Chrome profile and needs its own QR code scan")
+        sessions_layout.addWidget(self.sessions_input)
+        sessions_layout.addSpacing(20)
+        self.in_page_checkbox = QCheckBox("Fast in-page sending (open chats without reloading WhatsApp Web)")
+        sessions_layout.addWidget(self.in_page_checkbox)
+        sessions_layout.addSpacing(20)
+        self.devtools_checkbox = QCheckBox("DevTools engine (experimental)")
+        self.devtools_checkbox.setToolTip("Drive Chrome over the DevTools protocol instead of chromedriver; "
+                                          "needs the websockets package")
+        sessions_layout.addWidget(self.devtools_checkbox)
+        sessions_layout.addSpacing(20)
+        self.prefetch_checkbox = QCheckBox("Load the next chat while waiting")
+        self.prefetch_checkbox.setToolTip("Prepare the next contact's chat during the delay, so only the send "
+                                          "click is paced")
+        sessions_layout.addWidget(self.prefetch_checkbox)
+        sessions_layout.addSpacing(20)
+        self.resume_checkbox = QCheckBox("Resume where the last run stopped")
+        self.resume_checkbox.setChecked(True)
+        self.resume_checkbox.setToolTip("Contacts already sent by an earlier run of this file and template are skipped")
+        sessions_layout.addWidget(self.resume_checkbox)
+        sessions_layout.addStretch()
+        file_layout.addLayout(sessions_layout)
+        
         send_layout.addWidget(file_card)
 
         # Message Template Section
@@ -592,10 +859,25 @@ class MainWindow(QMainWindow):
         msg_layout.addWidget(msg_title)
         
         self.message_template = QTextEdit()
-        self.message_template.setPlaceholderText("Enter your message template here...\nUse {name} for customer name")
+        self.message_template.setPlaceholderText("Enter your message template here...\nUse {name} for customer name or {Column} for any column, e.g. {name:title|Customer}")
         self.message_template.setMinimumHeight(120)
         msg_layout.addWidget(self.message_template)
         
+        attachment_layout = QHBoxLayout()
+        self.attachment_input = QLineEdit()
+        self.attachment_input.setReadOnly(True)
+        self.attachment_input.setPlaceholderText("No attachment (or per contact from an 'Attachment' column)")
+        attachment_layout.addWidget(self.attachment_input)
+        attach_btn = QPushButton("Attach File...")
+        attach_btn.clicked.connect(self.select_attachment)
+        attachment_layout.addWidget(attach_btn)
+        clear_attachment_btn = QPushButton("Clear")
+        clear_attachment_btn.clicked.connect(self.attachment_input.clear)
+        attachment_layout.addWidget(clear_attachment_btn)
+        self.as_document_checkbox = QCheckBox("Send photos and videos as documents (no compression)")
+        attachment_layout.addWidget(self.as_document_checkbox)
+        msg_layout.addLayout(attachment_layout)
+        
         send_layout.addWidget(msg_card)
 
         # Preview Section
@@ -618,18 +900,38 @@ class MainWindow(QMainWindow):
         
         preview_layout.addLayout(preview_header)
         
-        # Data Table with scroll
-        self.data_table = QTableWidget(0, 3)
-        self.data_table.setHorizontalHeaderLabels(["Name", "Phone Number", "Message Preview"])
+        # Filter bar
+        filter_layout = QHBoxLayout()
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("Filter by name, number or message...")
+        self.status_filter = QComboBox()
+        self.status_filter.addItems(["All", "Sent", "Queued", "Retrying", "Failed", "Skipped", "Invalid"])
+        filter_layout.addWidget(self.filter_input)
+        filter_layout.addWidget(self.status_filter)
+        preview_layout.addLayout(filter_layout)
+        
+        # Filter once typing pauses rather than on every key
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(250)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.filter_input.textChanged.connect(self.filter_timer.start)
+        self.status_filter.currentIndexChanged.connect(self.apply_filter)
+        
+        # Data Table, backed by the whole cached sheet
+        self.contact_model = ContactTableModel(self)
+        self.data_table = QTableView()
+        self.data_table.setModel(self.contact_model)
+        self.data_table.setSortingEnabled(True)
+        self.data_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
         self.data_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.data_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.data_table.verticalHeader().setDefaultSectionSize(32)
+        self.data_table.setWordWrap(False)
         self.data_table.setAlternatingRowColors(True)
-        self.data_table.verticalHeader().setVisible(False)
+        self.data_table.setMinimumHeight(320)
         self.data_table.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-        
-        table_scroll = QScrollArea()
-        table_scroll.setWidgetResizable(True)
-        table_scroll.setWidget(self.data_table)
-        preview_layout.addWidget(table_scroll)
+        preview_layout.addWidget(self.data_table)
         
         send_layout.addWidget(preview_card)
 
@@ -663,8 +965,32 @@ class MainWindow(QMainWindow):
         self.log_widget = LogWidget()
         log_layout.addWidget(self.log_widget)
 
+        # ==== Metrics Tab ====
+        metrics_tab = QWidget()
+        metrics_layout = QVBoxLayout(metrics_tab)
+        metrics_layout.setContentsMargins(10, 10, 10, 10)
+
+        self.metrics_table = QTableWidget(0, len(METRICS_COLUMNS))
+        self.metrics_table.setHorizontalHeaderLabels([label for label, _, _ in METRICS_COLUMNS])
+        self.metrics_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.metrics_table.verticalHeader().setVisible(False)
+        self.metrics_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        metrics_layout.addWidget(self.metrics_table)
+
+        export_layout = QHBoxLayout()
+        export_layout.addStretch()
+        export_csv_btn = QPushButton("Export CSV")
+        export_csv_btn.clicked.connect(lambda: self.export_metrics("csv"))
+        export_json_btn = QPushButton("Export JSON")
+        export_json_btn.clicked.connect(lambda: self.export_metrics("json"))
+        export_layout.addWidget(export_csv_btn)
+        export_layout.addWidget(export_json_btn)
+        metrics_layout.addLayout(export_layout)
+        self.metrics_refreshed_at = 0
+
         tab_widget.addTab(send_tab, "Send Messages")
         tab_widget.addTab(log_tab, "Activity Log")
+        tab_widget.addTab(metrics_tab, "Metrics")
         
         main_layout.addWidget(scroll)  # Add scrollable area
 
@@ -673,6 +999,36 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(self.status_bar)
 
         self.setCentralWidget(main_widget)
+    def fetch_logo(self, path):
+        # Runs on a worker thread, the GUI gets the image through logo_fetched and errors through logo_failed
+        import requests
+        try:
+            response = requests.get(LOGO_URL, timeout=10)
+            response.raise_for_status()  # Raise an HTTPError for bad responses
+        except requests.exceptions.RequestException as e:
+            self.logo_failed.emit(f"Error fetching logo image: {e}")
+            return
+        self.logo_fetched.emit(response.content)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(response.content)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            self.logo_failed.emit(f"Error saving logo image: {e}")
+    
+    def set_logo(self, data):
+        logo_pixmap = QPixmap()
+        if logo_pixmap.loadFromData(data):
+            self.logo_label.setPixmap(logo_pixmap.scaledToHeight(60, Qt.SmoothTransformation))
+    
+    def log_startup_time(self):
+        """Called from the event loop once the window is shown, i.e. right after the first paint."""
+        shown = (time.perf_counter() - STARTED_AT) * 1000
+        message = (f"Started in {shown:.0f} ms (imports {(IMPORTED_AT - STARTED_AT) * 1000:.0f} ms, "
+                   f"window {(self.built_at - IMPORTED_AT) * 1000:.0f} ms)")
+        self.log_widget.add_log_entry(message, "info")
+    
     def set_file_path(self, file_path):
         self.file_path.setText(file_path)
         self.status_bar.update_status(f"Excel file selected: {os.path.basename(file_path)}", status_type="info")
@@ -680,11 +1036,11 @@ class MainWindow(QMainWindow):
         
         try:
             # قراءة ملف Excel
-            df = pd.read_excel(file_path)
+            df = self.contact_store.load(file_path)
             message_col = "Message"  # اسم العمود الافتراضي للرسالة
             
             # إذا كان العمود موجودًا، قم بتحميل الرسالة الأولى في خانة التمبلت
-            if message_col in df.columns and not df[message_col].isnull().all():
+            if message_col in df.columns and len(df) and (df[message_col] != "").any():
                 first_message = str(df[message_col].iloc[0])
                 self.message_template.setPlainText(first_message)
             else:
@@ -692,6 +1048,30 @@ class MainWindow(QMainWindow):
         except Exception as e:
             self.message_template.setPlainText("")  # في حالة وجود خطأ، اترك الحقل فارغًا
             self.log_widget.add_log_entry(f"Failed to load message template: {str(e)}", "error")
+    def select_attachment(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "Select Attachment", "", "All Files (*)")
+        if file_path:
+            self.attachment_input.setText(file_path)
+
+    def import_opt_outs(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Select Opt-out List", "", "Contact Files (*.xlsx *.xlsm *.xls *.csv)"
+        )
+        if not file_path:
+            return
+        try:
+            df = read_table(file_path)
+            # رقم الواتساب من العمود الافتراضي أو من العمود الأول
+            column = "Whatsapp Number" if "Whatsapp Number" in df.columns else df.columns[0]
+            numbers = normalize_numbers(df[column], self.country_code_input.text(), drop_duplicates=False)
+            added = self.history.add_suppressions(numbers.loc[numbers["reason"] == "", "number"])
+            status_msg = f"Added {added} numbers to the opt-out list ({self.history.suppressed_count()} in total)"
+            self.status_bar.update_status(status_msg, status_type="success")
+            self.log_widget.add_log_entry(status_msg, "success")
+        except Exception as e:
+            error_msg = f"Failed to import opt-out list: {str(e)}"
+            QMessageBox.critical(self, "Error", error_msg)
+            self.log_widget.add_log_entry(error_msg, "error")
     def load_preview(self):
         excel_file = self.file_path.text()
         if not excel_file:
@@ -704,7 +1084,7 @@ class MainWindow(QMainWindow):
             number_col = "Whatsapp Number"
             message_col = "Message"
             
-            df = pd.read_excel(excel_file)
+            df = self.contact_store.load(excel_file)
             
             # التحقق من وجود الأعمدة
             for col in [name_col, number_col, message_col]:
@@ -713,31 +1093,29 @@ class MainWindow(QMainWindow):
                     self.log_widget.add_log_entry(f"Column '{col}' not found in Excel file", "error")
                     return
             
-            # عرض المعاينة
-            self.data_table.setRowCount(0)
-            preview_rows = min(5, len(df))
-            self.data_table.setRowCount(preview_rows)
-            
             template = self.message_template.toPlainText()
-            
-            for i in range(preview_rows):
-                name = str(df.iloc[i][name_col])
-                number = str(df.iloc[i][number_col])
-                
-                # استخدام التمبلت إذا كان موجودًا
-                if template:
-                    message = template.replace("{name}", name)
-                else:
-                    message = str(df.iloc[i][message_col]).replace("{name}", name)
-                
-                self.data_table.setItem(i, 0, QTableWidgetItem(name))
-                self.data_table.setItem(i, 1, QTableWidgetItem(number))
-                self.data_table.setItem(i, 2, QTableWidgetItem(message))
+            if template:
+                missing = compile_template(template).missing_fields(df.columns)
+                if missing:
+                    self.log_widget.add_log_entry(f"Template fields not found in Excel file: {', '.join(missing)}", "warning")
             
             status_msg = f"Loaded {len(df)} contacts from Excel file"
             self.status_bar.update_status(status_msg, status_type="success")
             self.log_widget.add_log_entry(status_msg, "success")
             
+            # التحقق من الأرقام قبل الإرسال
+            numbers = normalize_numbers(df[number_col], self.country_code_input.text())
+            valid_count, rejected = summarize(numbers)
+            if rejected:
+                details = ", ".join(f"{count} {reason}" for reason, count in rejected.items())
+                self.log_widget.add_log_entry(f"{valid_count} valid numbers, {sum(rejected.values())} will be skipped ({details})", "warning")
+            
+            # عرض كل جهات الاتصال في الجدول
+            reasons = numbers["reason"]
+            invalid = reasons[reasons != ""]
+            statuses = {row: f"invalid: {reason}" for row, reason in zip(df.index[(reasons != "").to_numpy()], invalid)}
+            self.contact_model.set_table(df, name_col, number_col, message_col, template, statuses)
+            
             # تمكين زر الإرسال بعد عرض المعاينة
             self.start_btn.setEnabled(True)
             
@@ -757,30 +1135,33 @@ class MainWindow(QMainWindow):
                 QMessageBox.warning(self, "Warning", "Please enter a valid delay (seconds)")
                 return
             
-            # If user provided a template, update the message column
+            try:
+                session_count = max(1, int(self.sessions_input.text() or 1))
+            except ValueError:
+                session_count = 1
+            from browser_session import SessionManager, worker_profile_path
+            while len(self.browser_sessions) < session_count:
+                self.browser_sessions.append(SessionManager(worker_profile_path(len(self.browser_sessions))))
+            
+            # The template is rendered per contact by the sender, no temporary file is written
             template = self.message_template.toPlainText()
             if template:
-                try:
-                    df = pd.read_excel(excel_file)
-                    message_col = "Message"  # Hardcoded column name
-                    
-                    # Create a temporary Excel file with our template
-                    temp_file = excel_file.replace(".xlsx", "_temp.xlsx")
-                    df[message_col] = template
-                    df.to_excel(temp_file, index=False)
-                    excel_file = temp_file
-                    
-                    self.log_widget.add_log_entry(f"Created temporary Excel file with message template", "info")
-                except Exception as e:
-                    error_msg = f"Failed to apply message template: {str(e)}"
-                    QMessageBox.critical(self, "Error", error_msg)
-                    self.log_widget.add_log_entry(error_msg, "error")
-                    return
+                self.log_widget.add_log_entry("Using the message template for all contacts", "info")
             
             # Start the sender thread
-            self.sender_thread = WhatsAppSender(excel_file, delay)
+            self.sender_thread = WhatsAppSender(excel_file, delay, self.contact_store, template or None,
+                                                self.country_code_input.text(), self.browser_sessions[:session_count],
+                                                "in_page" if self.in_page_checkbox.isChecked() else "navigate",
+                                                int(self.per_minute_input.text() or 0) or None,
+                                                int(self.per_hour_input.text() or 0) or None,
+                                                self.journal, self.resume_checkbox.isChecked(), self.history,
+                                                int(self.skip_recent_input.text() or 0) or None,
+                                                self.attachment_input.text() or None,
+                                                self.as_document_checkbox.isChecked(),
+                                                "devtools" if self.devtools_checkbox.isChecked() else "selenium",
+                                                1 if self.prefetch_checkbox.isChecked() else 0)
             
-            self.sender_thread.update_progress.connect(self.update_progress)
+            self.progress_timer.start()
             self.sender_thread.finished.connect(self.process_finished)
             self.sender_thread.start()
             
@@ -790,17 +1171,76 @@ class MainWindow(QMainWindow):
             self.status_bar.update_status("Starting WhatsApp Web...", 0, "info")
             self.log_widget.add_log_entry("Started sending process", "info")
         
+    def apply_filter(self):
+        status = self.status_filter.currentText()
+        self.contact_model.set_filter(self.filter_input.text(), "" if status == "All" else status.lower())
+        
     def stop_sending(self):
             if self.sender_thread and self.sender_thread.isRunning():
                 self.sender_thread.stop()
                 self.status_bar.update_status("Stopping process...", status_type="warning")
                 self.log_widget.add_log_entry("Stopping sending process...", "warning")
         
-    def update_progress(self, value, message, status_type):
-            self.status_bar.update_status(message, value, status_type)
-            self.log_widget.add_log_entry(message, status_type)
+    def poll_progress(self):
+            snapshot = self.sender_thread.progress.snapshot()
+            for rows, status in snapshot.statuses:
+                self.contact_model.set_status(rows, status)
+            for message, status_type in snapshot.events:
+                self.log_widget.add_log_entry(message, status_type)
+            if snapshot.dropped:
+                self.log_widget.add_log_entry(f"{snapshot.dropped} progress messages were dropped", "warning")
+            
+            done = snapshot.sent + snapshot.failed
+            percent = WhatsAppSender.progress_percent(done - 1, snapshot.total) if done else 0
+            if snapshot.events:
+                message, status_type = snapshot.events[-1]
+                self.status_bar.update_status(message, percent, status_type)
+            else:
+                self.status_bar.progress_bar.setValue(percent)
+            
+            stats = f"Sent {snapshot.sent} · Failed {snapshot.failed} · Pending {snapshot.pending}"
+            if snapshot.per_minute:
+                stats += f" · {snapshot.per_minute:.1f}/min"
+            if snapshot.eta is not None:
+                stats += f" · ETA {int(snapshot.eta // 3600)}:{int(snapshot.eta % 3600 // 60):02d}:{int(snapshot.eta % 60):02d}"
+            self.status_bar.stats_label.setText(stats)
+            if time.monotonic() - self.metrics_refreshed_at >= 1:
+                self.refresh_metrics()
+
+    def refresh_metrics(self):
+            self.metrics_refreshed_at = time.monotonic()
+            phases = self.sender_thread.metrics.snapshot() if self.sender_thread else {}
+            self.metrics_table.setRowCount(len(phases))
+            for row, (phase, summary) in enumerate(phases.items()):
+                self.metrics_table.setItem(row, 0, QTableWidgetItem(phase.replace("_", " ").capitalize()))
+                for column, (_, key, scale) in enumerate(METRICS_COLUMNS[1:], start=1):
+                    value = summary[key]
+                    text = "" if value is None else str(value) if key == "count" else f"{value * scale:.1f}"
+                    item = QTableWidgetItem(text)
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                    self.metrics_table.setItem(row, column, item)
+
+    def export_metrics(self, file_format):
+            if not self.sender_thread:
+                QMessageBox.information(self, "Metrics", "Send a campaign first to collect timings.")
+                return
+            file_path, _ = QFileDialog.getSaveFileName(self, "Export Metrics", f"metrics.{file_format}",
+                                                       f"{file_format.upper()} Files (*.{file_format})")
+            if not file_path:
+                return
+            try:
+                if file_format == "csv":
+                    self.sender_thread.metrics.write_csv(file_path)
+                else:
+                    self.sender_thread.metrics.write_json(file_path)
+                self.log_widget.add_log_entry(f"Metrics exported to {file_path}", "success")
+            except OSError as e:
+                QMessageBox.warning(self, "Error", f"Failed to export metrics: {str(e)}")
         
     def process_finished(self, success, message):
+            self.progress_timer.stop()
+            self.poll_progress()
+            self.refresh_metrics()
             self.status_bar.update_status(message, 100 if success else 0, "success" if success else "error")
             self.log_widget.add_log_entry(message, "success" if success else "error")
             self.start_btn.setEnabled(True)
@@ -813,10 +1253,24 @@ class MainWindow(QMainWindow):
 
                 self.log_widget.add_log_entry("Process was stopped by user", "warning")
 
+    def closeEvent(self, event):
+            if self.sender_thread and self.sender_thread.isRunning():
+                self.sender_thread.stop()
+                self.sender_thread.wait(5000)
+            for session in self.browser_sessions:
+                session.close()
+            self.contact_model.wait()
+            self.journal.close()
+            self.history.close()
+            super().closeEvent(event)
+
+IMPORTED_AT = time.perf_counter()
+
 if __name__ == "__main__":
    
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
     window = MainWindow()
     window.show()
+    QTimer.singleShot(0, window.log_startup_time)
     sys.exit(app.exec_())
@@ -0,0 +1,7 @@
+import os
+
+
+def data_dir(*parts):
+    """Per-user folder for the app's own files (cache, reports, profiles, journals)."""
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "WhatsAppSender", *parts)
@@ -0,0 +1,149 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from app_paths import data_dir
+
+# How WhatsApp sends a file: photos and videos go through its media flow (and get recompressed),
+# anything else is sent as a document, byte for byte
+IMAGE = "image"
+VIDEO = "video"
+DOCUMENT = "document"
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+VIDEO_EXTENSIONS = ('.mp4', '.3gp', '.mov')
+
+# WhatsApp's size limits
+MEDIA_MAX_BYTES = 16 * 2 ** 20
+DOCUMENT_MAX_BYTES = 2 * 2 ** 30
+
+# Staging folders left behind by campaigns that never finished (crash, killed process) are removed
+# after this long; a campaign removes its own when it ends
+STAGE_MAX_AGE = 7 * 24 * 3600
+
+# One prepared file, shared by every contact it is sent to. path is the content-addressed copy
+# the browser uploads from, so the campaign is unaffected if the original is moved or edited.
+Attachment = namedtuple("Attachment", ["path", "name", "kind", "size", "sha256"])
+
+
+class AttachmentError(Exception):
+    """An attachment cannot be sent: missing, unreadable, empty or over WhatsApp's size limit."""
+
+
+def attachment_kind(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        return IMAGE
+    if ext in VIDEO_EXTENSIONS:
+        return VIDEO
+    return DOCUMENT
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class AttachmentCache:
+    """Checks and stages every distinct attachment once per campaign, not once per contact.
+
+    prepare() is keyed on the file's path, size and modification time, so the same brochure
+    named on 50,000 rows is read, hashed and staged once; copies of it under other paths reuse
+    the staged file. Size and compression checks happen here, before the first message goes out.
+    as_document sends photos and videos as documents, so WhatsApp does not recompress them;
+    media over the media limit is sent as a document automatically.
+
+    Each cache stages into a folder of its own under stage_root, which release() deletes once
+    the campaign is over.
+    """
+
+    def __init__(self, stage_root=None, as_document=False):
+        self.stage_root = stage_root or data_dir("attachments")
+        self.stage_dir = None  # Created on the first file staged
+        self.as_document = as_document
+        self.notes = []  # Warnings about how files will be sent, for the activity log
+        self._by_file = {}
+        self._by_hash = {}
+        self._lock = threading.Lock()
+
+    def prepare(self, path):
+        """Return the Attachment for path; raises AttachmentError if it cannot be sent."""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            raise AttachmentError(f"Attachment not found: {path}")
+        key = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._by_file.get(key)
+            if cached is not None:
+                return cached
+            attachment = self._prepare(path, stat.st_size)
+            self._by_file[key] = attachment
+            return attachment
+
+    def _prepare(self, path, size):
+        name = os.path.basename(path)
+        if not size:
+            raise AttachmentError(f"Attachment is empty: {name}")
+        kind = attachment_kind(path)
+        if kind != DOCUMENT and self.as_document:
+            kind = DOCUMENT
+        elif kind != DOCUMENT and size > MEDIA_MAX_BYTES:
+            self.notes.append(f"{name} is over WhatsApp's {MEDIA_MAX_BYTES // 2 ** 20} MB media limit, "
+                              f"it will be sent as a document")
+            kind = DOCUMENT
+        elif kind == IMAGE and size > 1 * 2 ** 20:
+            self.notes.append(f"WhatsApp will recompress {name} ({size / 2 ** 20:.1f} MB), "
+                              f"send it as a document to keep full quality")
+        if kind == DOCUMENT and size > DOCUMENT_MAX_BYTES:
+            raise AttachmentError(f"Attachment is over WhatsApp's {DOCUMENT_MAX_BYTES // 2 ** 30} GB limit: {name}")
+
+        try:
+            sha256 = file_sha256(path)
+        except OSError as e:
+            raise AttachmentError(f"Attachment cannot be read: {name} ({str(e)})")
+        staged = self._by_hash.get((sha256, name))
+        if staged is None:
+            staged = self._by_hash[(sha256, name)] = self._stage(path, sha256)
+        return Attachment(staged, name, kind, size, sha256)
+
+    def _stage(self, path, sha256):
+        if self.stage_dir is None:
+            os.makedirs(self.stage_root, exist_ok=True)
+            prune_stage(self.stage_root)
+            self.stage_dir = tempfile.mkdtemp(prefix="campaign-", dir=self.stage_root)
+        # Filed under the content hash but keeping the file name, which WhatsApp shows on documents
+        staged = os.path.join(self.stage_dir, sha256[:16], os.path.basename(path))
+        if not os.path.exists(staged):
+            os.makedirs(os.path.dirname(staged), exist_ok=True)
+            shutil.copyfile(path, staged + ".tmp")
+            os.replace(staged + ".tmp", staged)
+        return staged
+
+    def release(self):
+        """Delete the staged copies; the Attachments handed out must not be sent afterwards."""
+        with self._lock:
+            if self.stage_dir is not None:
+                shutil.rmtree(self.stage_dir, ignore_errors=True)
+            self.stage_dir = None
+            self._by_file.clear()
+            self._by_hash.clear()
+
+
+def prune_stage(stage_root, max_age=STAGE_MAX_AGE):
+    """Delete staging folders under stage_root older than max_age seconds."""
+    cutoff = time.time() - max_age
+    for entry in os.scandir(stage_root):
+        try:
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+        except OSError:
+            pass
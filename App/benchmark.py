@@ -0,0 +1,221 @@
+"""Throughput benchmark of the sending pipeline, runnable offline.
+
+    python benchmark.py                                   # in-process mock transport, 1k/10k/100k contacts
+    python benchmark.py --sessions 4 --latency-ms 5       # 4 parallel sessions, 5 ms per send
+    python benchmark.py --transport web --sizes 100 200   # headless Chrome against mock_server
+    python benchmark.py --transport web --compare-profiles --sizes 100   # lean vs full Chrome profile
+    python benchmark.py --attachment brochure.pdf --upload-ms 50          # media campaign
+    python benchmark.py --transport web --engine devtools --sizes 100     # DevTools engine instead of Selenium
+    python benchmark.py --delay 0.05 --latency-ms 40 --jitter 0.8 --prefetch 2 --sizes 200   # pipelined sending
+
+Each run renders the template for every contact and pushes the jobs through SenderPool, then
+reports messages/sec, p50/p99 per-message send latency and peak memory (plus chat-ready time
+and Chrome's memory on the web transport). --json saves the results, so two builds can be
+compared.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from attachments import AttachmentCache
+from contacts import table_contacts, NAME_COLUMN, NUMBER_COLUMN, MESSAGE_COLUMN
+from message_template import compile_template
+from metrics import Metrics, CHAT_READY
+from process_memory import rss_bytes
+from retry_queue import RetryPolicy
+from sender_pool import SenderPool
+from transport import MockTransport, ENGINES, SELENIUM
+
+TEMPLATE = "Hello {name}, your order {Order} is ready."
+
+
+def make_contacts(size):
+    import pandas as pd
+
+    return pd.DataFrame({
+        NAME_COLUMN: [f"Customer {i}" for i in range(size)],
+        NUMBER_COLUMN: [str(201000000000 + i) for i in range(size)],
+        MESSAGE_COLUMN: [""] * size,
+        "Order": [f"#{100000 + i}" for i in range(size)],
+    }, index=range(1, size + 1), dtype=object)
+
+
+class MemorySampler(threading.Thread):
+    """Samples RSS in the background and keeps the peak."""
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = rss_bytes()
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            rss = rss_bytes()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+        return self.peak
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_once(size, args, sessions, transport_factory):
+    df = make_contacts(size)
+    template = compile_template(TEMPLATE).bind(list(df.columns))
+    durations = []
+    failed = []
+
+    def on_result(result):
+        durations.append(result.duration)
+        if not result.ok:
+            failed.append(result.kind)
+
+    metrics = Metrics()
+    attachments = AttachmentCache()
+    attachment = attachments.prepare(args.attachment) if args.attachment else None
+    jobs = ((contact, template.render(contact.values), attachment) for contact in table_contacts(df))
+    pool = SenderPool(sessions, args.delay, on_result=on_result, retry_policy=RetryPolicy(max_attempts=1),
+                      transport_factory=transport_factory, metrics=metrics, engine=args.engine,
+                      prefetch=args.prefetch)
+    sampler = MemorySampler()
+    sampler.start()
+    started = time.perf_counter()
+    pool.run(jobs)
+    elapsed = time.perf_counter() - started
+    attachments.release()
+    peak = sampler.stop()
+    chat_ready = metrics.snapshot().get(CHAT_READY, {}).get("p50")
+    usages = [session.usage() for session in sessions if hasattr(session, "usage")]
+    browser_rss = [usage.rss for usage in usages if usage and usage.rss]
+
+    durations.sort()
+    return {
+        "contacts": size,
+        "sessions": len(sessions),
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(pool.completed / elapsed, 1) if elapsed else None,
+        "p50_ms": round(percentile(durations, 0.50) * 1000, 3) if durations else None,
+        "p99_ms": round(percentile(durations, 0.99) * 1000, 3) if durations else None,
+        "peak_rss_mb": round(peak / 2 ** 20, 1) if peak else None,
+        "chat_ready_p50_ms": round(chat_ready * 1000, 1) if chat_ready is not None else None,
+        "browser_rss_mb": round(sum(browser_rss) / len(browser_rss) / 2 ** 20, 1) if browser_rss else None,
+        "sent": pool.succeeded,
+        "failed": len(failed),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the sending pipeline against a mock WhatsApp.")
+    parser.add_argument("--transport", choices=("mock", "web"), default="mock",
+                        help="mock: in-process, no browser; web: headless Chrome against mock_server")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--sessions", type=int, default=1)
+    parser.add_argument("--delay", type=float, default=0, help="Minimum seconds between sends per session")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Time a send (or chat page) takes")
+    parser.add_argument("--attachment", help="Send this file with every message")
+    parser.add_argument("--upload-ms", type=float, default=0, help="mock: time an attachment adds to a send")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- fraction applied to the latency")
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--invalid-rate", type=float, default=0.0)
+    parser.add_argument("--queued-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--engine", choices=ENGINES, default=SELENIUM,
+                        help="web: drive Chrome through chromedriver or straight over DevTools")
+    parser.add_argument("--prefetch", type=int, default=0,
+                        help="Chats each session prepares ahead of its send click (web: at most 1)")
+    parser.add_argument("--full-profile", action="store_true",
+                        help="web: keep images, media, fonts and background features (no lean profile)")
+    parser.add_argument("--compare-profiles", action="store_true",
+                        help="web: run every size with the lean and the full profile and report the savings")
+    parser.add_argument("--json", help="Also write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def run_sizes(args, lean):
+    server = None
+    if args.transport == "web":
+        from mock_server import MockWhatsAppServer
+        from browser_session import SessionManager
+
+        server = MockWhatsAppServer(latency_ms=args.latency_ms, invalid_rate=args.invalid_rate,
+                                    timeout_rate=args.timeout_rate, queued_rate=args.queued_rate,
+                                    seed=args.seed).start()
+        profiles = tempfile.mkdtemp(prefix="wa-bench-")
+        sessions = [SessionManager(os.path.join(profiles, f"session-{i + 1}"), base_url=server.url, lean=lean)
+                    for i in range(args.sessions)]
+        transport_factory = None
+    else:
+        sessions = [MockTransport(args.latency_ms / 1000, args.jitter, args.timeout_rate, args.invalid_rate,
+                                  args.queued_rate, args.seed + i, args.upload_ms / 1000) for i in range(args.sessions)]
+        transport_factory = lambda transport: transport
+
+    results = []
+    try:
+        print(f"{'contacts':>9} {'msg/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'peak MB':>8} {'ready ms':>9} "
+              f"{'chrome MB':>10} {'seconds':>8} {'failed':>7}")
+        for size in args.sizes:
+            result = run_once(size, args, sessions, transport_factory)
+            if server and result["browser_rss_mb"] is None and not results:
+                print("Chrome memory is unavailable: process memory cannot be read here (install psutil)",
+                      flush=True)
+            result["profile"] = "lean" if lean else "full"
+            results.append(result)
+            print(f"{result['contacts']:>9} {result['messages_per_second']:>10} {result['p50_ms']:>8} "
+                  f"{result['p99_ms']:>8} {result['peak_rss_mb']:>8} {str(result['chat_ready_p50_ms']):>9} "
+                  f"{str(result['browser_rss_mb']):>10} {result['seconds']:>8} {result['failed']:>7}", flush=True)
+    finally:
+        if server:
+            for session in sessions:
+                session.close()
+            server.stop()
+    return results
+
+
+def savings(full, lean, key, higher_is_better=False):
+    """Percentage the lean run improved on the full one, as text."""
+    if not full.get(key) or lean.get(key) is None:
+        return "n/a"
+    change = (lean[key] - full[key]) / full[key] * 100
+    return f"{change if higher_is_better else -change:.1f}%"
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    profiles = [True, False] if args.compare_profiles else [not args.full_profile]
+    results = []
+    for lean in profiles:
+        if len(profiles) > 1:
+            print(f"{'lean' if lean else 'full'} browser profile")
+        results.extend(run_sizes(args, lean))
+
+    if args.compare_profiles:
+        print("Lean profile savings:")
+        for lean_result, full_result in zip(results[:len(args.sizes)], results[len(args.sizes):]):
+            if full_result["browser_rss_mb"] is None or lean_result["browser_rss_mb"] is None:
+                memory = "unavailable (install psutil)"
+            else:
+                memory = f"{savings(full_result, lean_result, 'browser_rss_mb')} lower"
+            print(f"{lean_result['contacts']:>9} contacts: chat ready "
+                  f"{savings(full_result, lean_result, 'chat_ready_p50_ms')} faster, Chrome memory "
+                  f"{memory}, throughput {savings(full_result, lean_result, 'messages_per_second', True)} higher")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"transport": args.transport, "args": vars(args), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
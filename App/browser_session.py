@@ -0,0 +1,193 @@
+import os
+import threading
+from collections import namedtuple
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from app_paths import data_dir
+from process_memory import tree_rss
+from whatsapp_web import WHATSAPP_URL
+
+TEXTBOX_XPATH = '//div[@role="textbox"][@contenteditable="true"]'
+
+# Lean sending profile: background features Chrome runs for a human user, off for a headless sender
+LEAN_ARGUMENTS = [
+    '--disable-extensions',
+    '--disable-background-networking',
+    '--disable-component-update',
+    '--disable-default-apps',
+    '--disable-sync',
+    '--disable-features=Translate,MediaRouter,OptimizationHints,AutofillServerCommunication',
+    '--mute-audio',
+    '--no-first-run',
+    '--blink-settings=imagesEnabled=false',
+]
+
+# Requests blocked through DevTools while sending: avatars, stickers, previews, media and web fonts.
+# Blocking per session (not through profile prefs) keeps the user's own Chrome profile untouched.
+BLOCKED_URLS = [
+    '*pps.whatsapp.net/*',  # profile pictures
+    '*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.ico*',
+    '*.mp4*', '*.webm*', '*.ogg*', '*.opus*', '*.mp3*',
+    '*.woff*', '*.woff2*', '*.ttf*', '*.otf*',
+]
+
+# What a session's browser costs: Chrome's resident memory and what its current page downloaded
+BrowserUsage = namedtuple("BrowserUsage", "rss requests transferred")
+
+
+def default_profile_path():
+    home = os.environ.get('USERPROFILE', os.path.expanduser('~'))
+    return os.path.join(home, 'AppData', 'Local', 'Google', 'Chrome', 'User Data', 'Default')
+
+
+def worker_profile_path(worker_id):
+    """Chrome profile for an extra sending session; worker 0 uses the default Chrome profile."""
+    if worker_id == 0:
+        return default_profile_path()
+    return data_dir("profiles", f"session-{worker_id + 1}")
+
+
+class SessionManager:
+    """Keeps one authenticated WhatsApp Web driver alive across campaigns.
+
+    The driver is started on first use and reused by every later campaign. get_driver()
+    checks it is still responsive and logged in, and starts a new one if it is not. A QR
+    code scan only happens in a visible window; once logged in, the session runs headless.
+    """
+
+    def __init__(self, profile_path=None, headless=True, login_timeout=60, base_url=WHATSAPP_URL, lean=True):
+        self.profile_path = profile_path or default_profile_path()
+        self.base_url = base_url  # WhatsApp Web, or a mock_server URL for offline runs
+        self.headless = headless
+        self.lean = lean  # Headless sessions skip images, media, fonts and background features
+        self.login_timeout = login_timeout
+        self.driver = None
+        self._lock = threading.RLock()
+
+    def _options(self, headless):
+        options = webdriver.ChromeOptions()
+        options.add_argument(f'user-data-dir={self.profile_path}')
+        if headless:
+            options.add_argument('--headless')
+            options.add_argument('--disable-gpu')
+            options.add_argument('--no-sandbox')
+            options.add_argument('--disable-dev-shm-usage')
+            if self.lean:
+                for argument in LEAN_ARGUMENTS:
+                    options.add_argument(argument)
+        return options
+
+    def _launch(self, headless):
+        driver = webdriver.Chrome(options=self._options(headless))
+        if headless and self.lean:
+            block_resources(driver)
+        driver.get(self.base_url)
+        return driver
+
+    @staticmethod
+    def _wait_logged_in(driver, timeout):
+        try:
+            WebDriverWait(driver, timeout).until(
+                EC.presence_of_element_located((By.XPATH, TEXTBOX_XPATH))
+            )
+            return True
+        except Exception:
+            return False
+
+    def is_alive(self):
+        """Return True if the current driver still answers commands."""
+        if self.driver is None:
+            return False
+        try:
+            self.driver.execute_script('return document.readyState')
+            return True
+        except Exception:
+            return False
+
+    def is_logged_in(self):
+        if not self.is_alive():
+            return False
+        try:
+            return bool(self.driver.find_elements(By.XPATH, TEXTBOX_XPATH))
+        except Exception:
+            return False
+
+    def get_driver(self, status=None):
+        """Return a live, logged-in driver, starting or reconnecting the session if needed.
+
+        status is an optional callable(message, status_type) used to report login progress.
+        Raises RuntimeError if the user does not log in within login_timeout seconds.
+        """
+        status = status or (lambda message, status_type: None)
+        with self._lock:
+            if self.is_logged_in():
+                return self.driver
+            if self.is_alive():
+                # Browser is fine but not on a loaded WhatsApp page, reload the app instead of relaunching
+                try:
+                    self.driver.get(self.base_url)
+                    if self._wait_logged_in(self.driver, 10):
+                        return self.driver
+                except Exception:
+                    pass
+            if self.driver is not None:
+                status("Browser session lost, reconnecting...", "warning")
+            self.close()
+
+            driver = self._launch(self.headless)
+            if self._wait_logged_in(driver, 10):
+                status("Logged into WhatsApp Web successfully.", "success")
+                self.driver = driver
+                return driver
+
+            # Not logged in: the QR code has to be scanned in a visible window
+            driver.quit()
+            driver = self._launch(headless=False)
+            if not self._wait_logged_in(driver, 10):
+                status("Please scan the QR code to log in.", "info")
+                if not self._wait_logged_in(driver, self.login_timeout):
+                    driver.quit()
+                    raise RuntimeError("Failed to log in: QR code was not scanned in time")
+            status("Logged into WhatsApp Web successfully.", "success")
+
+            if self.headless:
+                # Log-in is stored in the profile, continue in the background
+                driver.quit()
+                driver = self._launch(headless=True)
+                self._wait_logged_in(driver, 30)
+            self.driver = driver
+            return driver
+
+    def usage(self):
+        """Return the BrowserUsage of the current driver, or None if there is none."""
+        with self._lock:
+            if not self.is_alive():
+                return None
+            try:
+                service = getattr(self.driver, 'service', None)
+                rss = tree_rss(service.process.pid) if service and service.process else None
+                requests, transferred = self.driver.execute_script(
+                    "const entries = performance.getEntriesByType('resource');"
+                    "return [entries.length, entries.reduce((total, e) => total + (e.transferSize || 0), 0)];"
+                )
+                return BrowserUsage(rss, requests, transferred)
+            except Exception:
+                return None
+
+    def close(self):
+        with self._lock:
+            if self.driver is not None:
+                try:
+                    self.driver.quit()
+                except Exception:
+                    pass
+                self.driver = None
+
+
+def block_resources(driver, urls=BLOCKED_URLS):
+    """Make the driver's page skip requests matching urls (DevTools wildcard patterns)."""
+    driver.execute_cdp_cmd('Network.enable', {})
+    driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': list(urls)})
@@ -0,0 +1,84 @@
+from collections import deque
+from statistics import median
+
+
+class RecyclePolicy:
+    """When a sending browser gets restarted between two contacts.
+
+    - max_rss_mb: Chrome's memory (its whole process tree), checked every check_every sends.
+    - latency_factor / min_slowdown: the median of the last window sends is latency_factor times
+      the fresh-browser baseline and at least min_slowdown seconds slower.
+    - max_messages: sends on one driver, None for no limit.
+    The baseline is the median of the first baseline sends after a browser starts.
+    """
+
+    def __init__(self, max_rss_mb=1500, latency_factor=2.0, min_slowdown=1.0, max_messages=None,
+                 baseline=30, window=30, check_every=25):
+        self.max_rss_mb = max_rss_mb
+        self.latency_factor = latency_factor
+        self.min_slowdown = min_slowdown
+        self.max_messages = max_messages
+        self.baseline = baseline
+        self.window = window
+        self.check_every = check_every
+
+
+class BrowserWatchdog:
+    """Watches one worker's browser for the memory and latency creep of a long campaign.
+
+    WhatsApp Web leaks across thousands of chat openings; check() says when a fresh driver
+    would send faster. The reference latency is kept from the first browser, so a slowdown that
+    survives a restart (a slow network, not a leak) becomes the new reference instead of
+    triggering a restart loop.
+    """
+
+    def __init__(self, policy=None, on_warning=None):
+        self.policy = policy or RecyclePolicy()
+        self.on_warning = on_warning or (lambda message: None)
+        self.reference = None  # baseline send latency of a fresh browser
+        self.rss_unreadable = False  # Warned that memory cannot be read, so max_rss_mb is not enforced
+        self.restarted()
+
+    def restarted(self):
+        """Start watching a new driver."""
+        self.sends = 0
+        self.baseline = []
+        self.recent = deque(maxlen=self.policy.window)
+
+    def record(self, ok, duration):
+        self.sends += 1
+        if not ok:
+            return  # Failures are timeouts or quick rejections, neither says how fast sending is
+        if len(self.baseline) < self.policy.baseline:
+            self.baseline.append(duration)
+            if len(self.baseline) == self.policy.baseline:
+                self._set_reference(median(self.baseline))
+        else:
+            self.recent.append(duration)
+
+    def _set_reference(self, fresh):
+        # A restart that did not bring sending back to the old speed means the browser is not the cause
+        if self.reference is None or fresh > self._limit(self.reference):
+            self.reference = fresh
+
+    def _limit(self, reference):
+        return max(reference * self.policy.latency_factor, reference + self.policy.min_slowdown)
+
+    def check(self, transport):
+        """Return why the transport's browser should be restarted now, or None."""
+        policy = self.policy
+        if policy.max_messages and self.sends >= policy.max_messages:
+            return f"{self.sends} messages sent on one browser"
+        if policy.max_rss_mb and self.sends and self.sends % policy.check_every == 0:
+            usage = transport.usage()
+            if usage is not None and not usage.rss and not self.rss_unreadable:
+                self.rss_unreadable = True
+                self.on_warning("Browser memory cannot be read (is psutil installed?), "
+                                "the browser will not be restarted for using too much memory")
+            if usage is not None and usage.rss and usage.rss > policy.max_rss_mb * 2 ** 20:
+                return f"browser memory at {usage.rss / 2 ** 20:.0f} MB"
+        if self.reference is not None and len(self.recent) == policy.window:
+            current = median(self.recent)
+            if current > self._limit(self.reference):
+                return f"sends take {current:.1f}s, {self.reference:.1f}s on a fresh browser"
+        return None
@@ -0,0 +1,149 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from app_paths import data_dir
+
+# Per-contact states
+PENDING = "pending"
+SENDING = "sending"  # written just before the send click, left behind only by a crash
+SENT = "sent"
+FAILED = "failed"
+SKIPPED = "skipped"
+
+# Contacts in these states are never sent again when a campaign resumes
+DONE_STATES = (SENT, SENDING)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS contacts (
+    campaign_id INTEGER NOT NULL,
+    number TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (campaign_id, number)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS contacts_state ON contacts (campaign_id, state);
+"""
+
+
+def default_journal_path():
+    return data_dir("campaigns.db")
+
+
+def campaign_key(source, template=None):
+    """Identify a campaign by its contacts file and message template."""
+    text = f"{os.path.abspath(source)}\n{template or ''}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class CampaignJournal:
+    """Append-only record of per-contact send state, so an interrupted campaign can resume.
+
+    Stored in SQLite in WAL mode with synchronous=NORMAL: every state change is committed
+    to the WAL right away (safe against the app or Chrome crashing) while fsyncs are batched
+    at checkpoints. Contacts are keyed by normalized number, so resuming stays correct even
+    if rows were inserted or removed in the sheet meanwhile. A contact is marked "sending"
+    before its send click, so after a crash it is reported as interrupted rather than sent a
+    second time.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_journal_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def open_campaign(self, key, source, rows=(), numbers=(), restart=False):
+        """Return the Campaign for key, creating it (or starting it over if restart) as needed.
+
+        rows/numbers list the contacts about to be sent; more can be added with Campaign.add().
+        Contacts already known to an existing campaign keep their state, only their sheet row is
+        refreshed.
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            found = self._conn.execute("SELECT id FROM campaigns WHERE key = ?", (key,)).fetchone()
+            if found and restart:
+                self._conn.execute("DELETE FROM contacts WHERE campaign_id = ?", (found[0],))
+                self._conn.execute("DELETE FROM campaigns WHERE id = ?", (found[0],))
+                found = None
+            if found:
+                campaign_id = found[0]
+                self._conn.execute("UPDATE campaigns SET finished_at = NULL WHERE id = ?", (campaign_id,))
+            else:
+                campaign_id = self._conn.execute(
+                    "INSERT INTO campaigns (key, source, created_at) VALUES (?, ?, ?)", (key, source, now)
+                ).lastrowid
+            self._add(campaign_id, rows, numbers, now)
+        return Campaign(self, campaign_id, resumed=bool(found))
+
+    def _add(self, campaign_id, rows, numbers, now):
+        self._conn.executemany(
+            "INSERT INTO contacts (campaign_id, number, row, state, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (campaign_id, number) DO UPDATE SET row = excluded.row",
+            ((campaign_id, str(number), int(row), PENDING, now) for row, number in zip(rows, numbers)),
+        )
+
+    def close(self):
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.close()
+
+
+class Campaign:
+    def __init__(self, journal, campaign_id, resumed=False):
+        self.journal = journal
+        self.id = campaign_id
+        self.resumed = resumed
+
+    def _execute(self, sql, params=()):
+        with self.journal._lock, self.journal._conn as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def add(self, rows, numbers):
+        """Record more contacts of the campaign, e.g. the next chunk of a streamed sheet."""
+        with self.journal._lock, self.journal._conn:
+            self.journal._add(self.id, rows, numbers, time.time())
+
+    def counts(self):
+        """Return {state: number of contacts}."""
+        return dict(self._execute(
+            "SELECT state, COUNT(*) FROM contacts WHERE campaign_id = ? GROUP BY state", (self.id,)))
+
+    def numbers_in(self, states):
+        marks = ", ".join("?" * len(states))
+        return {r[0] for r in self._execute(
+            f"SELECT number FROM contacts WHERE campaign_id = ? AND state IN ({marks})", (self.id, *states))}
+
+    def done_numbers(self):
+        """Numbers that must not be sent again: sent, or interrupted mid-send."""
+        return self.numbers_in(DONE_STATES)
+
+    def mark(self, number, state, error=None):
+        self._execute(
+            "UPDATE contacts SET state = ?, error = ?, updated_at = ? WHERE campaign_id = ? AND number = ?",
+            (state, error, time.time(), self.id, str(number)))
+
+    def mark_many(self, numbers, state, error=None):
+        now = time.time()
+        with self.journal._lock, self.journal._conn as conn:
+            conn.executemany(
+                "UPDATE contacts SET state = ?, error = ?, updated_at = ? WHERE campaign_id = ? AND number = ?",
+                ((state, error, now, self.id, str(n)) for n in numbers))
+
+    def finish(self):
+        self._execute("UPDATE campaigns SET finished_at = ? WHERE id = ?", (time.time(), self.id))
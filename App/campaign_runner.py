@@ -0,0 +1,390 @@
+import os
+import threading
+import time
+from collections import namedtuple, Counter
+from itertools import islice
+
+from contacts import ContactStore, table_contacts, cell_text, ATTACHMENT_COLUMN
+from attachments import AttachmentCache, AttachmentError
+from phone_numbers import normalize_numbers, summarize, write_rejected_report
+from message_template import compile_template
+from campaign_journal import CampaignJournal, campaign_key, PENDING, SENDING, SENT, FAILED, SKIPPED
+from send_history import SendHistory
+from progress_channel import ProgressChannel
+from metrics import (Metrics, default_metrics_dir, LOAD_CONTACTS, VALIDATE_NUMBERS, FILTER_CONTACTS,
+                     PREPARE_ATTACHMENTS, RENDER)
+
+# CampaignResult.status values
+COMPLETED = "completed"
+STOPPED = "stopped"
+INVALID_INPUT = "invalid_input"
+NO_SESSION = "no_session"
+ERROR = "error"
+
+CampaignResult = namedtuple("CampaignResult", ["success", "message", "status"])
+
+# Rows validated, filtered and handed to the workers at a time
+CHUNK_SIZE = 5000
+
+
+class CampaignRunner:
+    """Runs one campaign end to end: load, validate, resume, filter, send through the pool.
+
+    Has no GUI dependency; the Qt window (app.WhatsAppSender) and the command line (cli.py)
+    are both clients that start run() on a thread of their own and poll self.progress.
+    """
+
+    def __init__(self, excel_file, delay, contact_store=None, template=None, country_code="",
+                 sessions=None, send_mode="navigate", per_minute=None, per_hour=None, journal=None,
+                 resume=True, history=None, skip_recent_days=None, metrics_dir=None,
+                 recycle_policy=None, attachment=None, send_as_document=False, engine="selenium",
+                 prefetch=0):
+        self.excel_file = excel_file
+        self.delay = delay
+        self.template = template  # Overrides the Message column when set
+        self.country_code = country_code  # Added to local numbers
+        self.sessions = sessions  # Shared SessionManagers (one per account), kept alive between campaigns
+        self.pool = None
+        self.per_minute = per_minute  # Rate caps per account, None for no cap
+        self.per_hour = per_hour
+        self.journal = journal  # CampaignJournal recording per-contact state for resuming
+        self.resume = resume  # Continue a previous run of the same campaign instead of starting over
+        self.history = history  # SendHistory shared by all campaigns: past sends and opt-outs
+        self.skip_recent_days = skip_recent_days  # Skip numbers messaged by any campaign this recently
+        self.send_mode = send_mode  # "navigate" reloads the page per contact, "in_page" stays in the app
+        self.progress = ProgressChannel()  # Polled by the client, so sending never waits on it
+        self.metrics = Metrics()  # Phase timings of this campaign, exported when it ends
+        self.metrics_dir = metrics_dir or default_metrics_dir()
+        self.recycle_policy = recycle_policy  # When workers restart a leaking browser, see browser_watchdog
+        self.attachment = attachment  # File sent to every contact, overrides the Attachment column when set
+        self.send_as_document = send_as_document  # Send photos and videos uncompressed, as documents
+        self.engine = engine  # transport.SELENIUM, or transport.DEVTOOLS to send over the DevTools protocol
+        self.prefetch = prefetch  # Chats each session loads ahead while the rate limiter holds the send back
+        self.contact_store = contact_store or ContactStore(use_sidecar=False)
+        # Default column names
+        self.message_column = "Message"
+        self.name_column = "Customers Name"
+        self.number_column = "Whatsapp Number"
+        self.attachment_column = ATTACHMENT_COLUMN
+        self.is_running = True
+
+    def stop(self):
+        self.is_running = False
+        if self.pool:
+            self.pool.stop()
+
+    def run(self):
+        """Send the campaign and return a CampaignResult; progress goes to self.progress meanwhile."""
+        from browser_session import SessionManager
+        from sender_pool import SenderPool
+        from retry_queue import DeadLetter, DELIVERY_UNKNOWN
+        
+        feed = None
+        try:
+            columns = self.contact_store.columns(self.excel_file)
+            for col in (self.name_column, self.number_column):
+                if col not in columns:
+                    return CampaignResult(False, f"Column '{col}' not found in Excel file", INVALID_INPUT)
+            
+            # Resume from the journal: contacts sent (or interrupted mid-send) in an earlier run are left out
+            journal = self.journal or CampaignJournal()
+            campaign = journal.open_campaign(campaign_key(self.excel_file, self.template), self.excel_file,
+                                             restart=not self.resume)
+            if campaign.resumed:
+                counts = campaign.counts()
+                message = f"Resuming campaign: {counts.get(SENT, 0)} contacts already sent"
+                if counts.get(SENDING):
+                    message += f", {counts[SENDING]} interrupted mid-send are not sent again"
+                self.progress.post(message, "info")
+            history = self.history or SendHistory()
+            
+            # The sheet is validated and filtered a chunk at a time, as the workers take contacts,
+            # so sending starts after the first chunk; everything up to there is checked before any
+            # browser time is spent
+            feed = ContactFeed(self, campaign, history)
+            chunks = (feed.prepare(chunk) for chunk in self.contact_chunks())
+            first = next((chunk for chunk in chunks if len(chunk)), None)
+            if feed.problems:
+                feed.finish()
+                more = f" (and {len(feed.problems) - 5} more)" if len(feed.problems) > 5 else ""
+                return CampaignResult(False, "Cannot send attachments: " + "; ".join(feed.problems[:5]) + more,
+                                      INVALID_INPUT)
+            if first is None:
+                feed.finish()
+                if not feed.valid:
+                    return CampaignResult(False, "No valid WhatsApp numbers to send to", INVALID_INPUT)
+                campaign.finish()
+                return CampaignResult(True, "No contacts left to send in this campaign", COMPLETED)
+            feed.sending = True
+            
+            # Templates are compiled once and bound to the sheet header, rows are rendered lazily
+            bound_templates = {}
+            attachment_index = columns.index(self.attachment_column) if self.attachment_column in columns else None
+            
+            # Messages are rendered lazily, as the workers pull contacts from the pool's queue
+            def jobs():
+                chunk = first
+                while chunk is not None:
+                    for contact in table_contacts(chunk, self.name_column, self.number_column, self.message_column):
+                        text = self.template or contact.message
+                        bound = bound_templates.get(text)
+                        if bound is None:
+                            bound = bound_templates[text] = compile_template(text).bind(columns)
+                        with self.metrics.time(RENDER):
+                            message = bound.render(contact.values)
+                        if self.attachment or attachment_index is None:
+                            yield contact, message, feed.attachments.get(self.attachment)
+                        else:
+                            path = cell_text(contact.values[attachment_index]).strip()
+                            yield contact, message, feed.attachments.get(path)
+                    chunk = next(chunks, None)
+                self.progress.set_total(feed.kept)
+                feed.finish()
+            
+            # Reuse the warm, logged-in browser sessions if there are any
+            owns_sessions = self.sessions is None
+            sessions = self.sessions or [SessionManager()]
+            
+            # Contacts that finally failed, written out as a sheet that can be loaded and sent again
+            dead_letter = DeadLetter(self.excel_file, columns)
+            
+            def on_result(result):
+                name, number = result.contact.name, result.contact.number
+                if result.ok:
+                    campaign.mark(number, SENT)
+                    history.record_send(number, self.excel_file)
+                elif result.retry_in is not None:
+                    campaign.mark(number, PENDING, str(result.error))
+                else:
+                    # A failure after the send click may still have delivered, so it is never sent again automatically
+                    campaign.mark(number, SENDING if result.kind == DELIVERY_UNKNOWN else FAILED, str(result.error))
+                    dead_letter.add(result.contact, result.kind, result.error, result.attempt)
+                if result.ok:
+                    row_status = result.state
+                elif result.retry_in is not None:
+                    row_status = "retrying"
+                else:
+                    row_status = f"failed: {result.kind}"
+                self.progress.row_status([result.contact.row], row_status)
+                if result.retry_in is None:
+                    self.progress.outcome(SENT if result.ok else FAILED)
+                if result.ok and result.state == "queued":
+                    status_msg, status_type = f"Queued for {name} ({number}), not confirmed yet", "warning"
+                elif result.ok:
+                    status_msg, status_type = f"Sent to {name} ({number})", "success"
+                elif result.retry_in is not None:
+                    status_msg = f"Failed to send to {name} ({number}) ({result.kind}), retrying in {result.retry_in:.0f}s"
+                    status_type = "warning"
+                else:
+                    status_msg, status_type = f"Failed to send to {name} ({number}): {str(result.error)}", "error"
+                self.progress.post(status_msg, status_type)
+            
+            def on_start(contact):
+                campaign.mark(contact.number, SENDING)
+                self.progress.row_status([contact.row], "sending")
+            
+            self.pool = SenderPool(sessions, self.delay, self.send_mode, on_result, self.progress.post,
+                                   self.per_minute, self.per_hour, on_start, metrics=self.metrics,
+                                   recycle_policy=self.recycle_policy, engine=self.engine,
+                                   prefetch=self.prefetch)
+            if not self.is_running:
+                self.pool.stop()
+            # The Prometheus file is kept current during the run for a node exporter to scrape
+            prometheus_path = os.path.join(self.metrics_dir, "whatsapp_sender.prom")
+            exported = threading.Event()
+            self.metrics.export_periodically(prometheus_path, exported)
+            try:
+                completed = self.pool.run(jobs())
+            finally:
+                exported.set()
+                self.export_metrics(prometheus_path)
+            feed.finish()
+            if self.pool.recycled:
+                self.progress.post(f"Browser restarted {self.pool.recycled} times to keep sending fast", "info")
+            
+            if owns_sessions:
+                for session in sessions:
+                    session.close()
+            if completed:
+                campaign.finish()
+            dead_letter_path = dead_letter.write()
+            if dead_letter_path:
+                self.progress.post(f"{len(dead_letter)} contacts failed, saved for resending to {dead_letter_path}", "warning")
+            if not self.is_running:
+                return CampaignResult(False, "Process was stopped by user", STOPPED)
+            if self.pool.sessions_lost and self.pool.completed == self.pool.abandoned:
+                return CampaignResult(False, "No browser session could be started", NO_SESSION)
+            if self.pool.sessions_lost:
+                return CampaignResult(False, f"Every browser session was lost after {self.pool.succeeded} sent; "
+                                             f"resume the campaign to send the rest", NO_SESSION)
+            message = f"Completed sending messages. Success: {self.pool.succeeded}/{self.pool.completed}"
+            if self.pool.unconfirmed:
+                message += f" ({self.pool.unconfirmed} still waiting for the sent tick)"
+            return CampaignResult(True, message, COMPLETED)
+            
+        except Exception as e:
+            return CampaignResult(False, f"Process failed: {str(e)}", ERROR)
+        finally:
+            if feed is not None:
+                feed.attachment_cache.release()  # The staged copies are only needed while sending
+
+    def contact_chunks(self):
+        """Yield the sheet as DataFrames of up to CHUNK_SIZE rows, indexed by sheet row.
+
+        Slices of the ContactStore's table when it is already parsed (the GUI preview loads it),
+        otherwise streamed from the file, so only one chunk is in memory at a time.
+        """
+        import pandas as pd
+
+        df = self.contact_store.cached(self.excel_file)
+        if df is not None:
+            for start in range(0, len(df), CHUNK_SIZE):
+                yield df.iloc[start:start + CHUNK_SIZE]
+            return
+        columns = self.contact_store.columns(self.excel_file)
+        contacts = self.contact_store.iter_contacts(self.excel_file, self.name_column, self.number_column,
+                                                    self.message_column)
+        while True:
+            with self.metrics.time(LOAD_CONTACTS):
+                batch = list(islice(contacts, CHUNK_SIZE))
+                chunk = pd.DataFrame([contact.values for contact in batch], columns=columns, dtype=object,
+                                     index=pd.Index([contact.row for contact in batch], name="row"))
+            if not batch:
+                return
+            yield chunk
+
+    def export_metrics(self, prometheus_path):
+        """Save this campaign's timings as JSON and CSV next to the Prometheus file."""
+        try:
+            name = os.path.splitext(os.path.basename(self.excel_file))[0]
+            base = os.path.join(self.metrics_dir, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}")
+            self.metrics.write_json(base + ".json")
+            self.metrics.write_csv(base + ".csv")
+            self.metrics.write_prometheus(prometheus_path)
+            self.progress.post(f"Send timings saved to {base}.csv", "info")
+        except OSError as e:
+            self.progress.post(f"Failed to save send timings: {str(e)}", "warning")
+
+
+class ContactFeed:
+    """Validates, resumes and filters a campaign's contacts one chunk of the sheet at a time.
+
+    Numbers are deduplicated across chunks with a running set of the numbers already accepted,
+    and each distinct attachment is checked once for the whole campaign. Attachment problems
+    found before sending starts are collected in problems; once sending, the affected rows are
+    skipped instead. Skip counts are posted once, by finish().
+    """
+
+    def __init__(self, runner, campaign, history):
+        self.runner = runner
+        self.campaign = campaign
+        self.history = history
+        self.done = campaign.done_numbers()
+        self.seen = set()  # Valid numbers of the chunks so far
+        self.estimate = runner.contact_store.count(runner.excel_file) or 0
+        self.read = 0
+        self.kept = 0
+        self.valid = 0
+        self.rejected = Counter()
+        self.report_path = None
+        self.suppressed = Counter()
+        self.attachment_cache = AttachmentCache(as_document=runner.send_as_document)
+        self.attachments = {}  # Path as written: Attachment
+        self.broken = {}  # Path as written: why it cannot be sent
+        self.problems = []
+        self.sending = False
+        self.finished = False
+
+    def prepare(self, chunk):
+        """Return the rows of chunk to send, with their numbers normalized."""
+        runner = self.runner
+        number_column = runner.number_column
+        self.read += len(chunk)
+        with runner.metrics.time(VALIDATE_NUMBERS):
+            numbers = normalize_numbers(chunk[number_column], runner.country_code, seen=self.seen)
+            valid_count, rejected = summarize(numbers)
+        self.valid += valid_count
+        if rejected:
+            self.rejected.update(rejected)
+            self.report_path = write_rejected_report(chunk, numbers, runner.excel_file, path=self.report_path)
+        valid = (numbers["reason"] == "").to_numpy()
+        chunk = chunk[valid].copy()
+        chunk[number_column] = numbers["number"].to_numpy()[valid]
+        
+        filter_started = runner.metrics.clock()
+        self.campaign.add(chunk.index, chunk[number_column])
+        done = chunk[number_column].isin(self.done)
+        if done.any():
+            runner.progress.row_status(chunk.index[done.to_numpy()].tolist(), "sent earlier")
+            chunk = chunk[~done]
+        
+        # Opt-outs and numbers already messaged by other campaigns never reach the browser
+        suppressed = self.history.check(chunk[number_column], runner.skip_recent_days, self.campaign)
+        suppressed_mask = (suppressed != "").to_numpy()
+        if suppressed_mask.any():
+            for reason, count in suppressed[suppressed_mask].value_counts().items():
+                self.campaign.mark_many(chunk[number_column][suppressed == reason], SKIPPED, reason)
+                runner.progress.row_status(chunk.index[(suppressed == reason).to_numpy()].tolist(), f"skipped: {reason}")
+                self.suppressed[reason] += int(count)
+            chunk = chunk[~suppressed_mask]
+        runner.metrics.observe(FILTER_CONTACTS, runner.metrics.clock() - filter_started)
+        
+        with runner.metrics.time(PREPARE_ATTACHMENTS):
+            chunk = self.prepare_attachments(chunk)
+        self.kept += len(chunk)
+        # The row count is an estimate until the whole sheet is read
+        runner.progress.set_total(max(self.estimate - (self.read - self.kept), self.kept))
+        return chunk
+
+    def paths(self, chunk):
+        """Attachment path as written for each row of chunk, "" for none."""
+        import pandas as pd
+
+        runner = self.runner
+        if runner.attachment or runner.attachment_column not in chunk.columns:
+            return pd.Series(runner.attachment or "", index=chunk.index, dtype=object)
+        return chunk[runner.attachment_column].map(lambda value: cell_text(value).strip())
+
+    def prepare_attachments(self, chunk):
+        """Check and stage the attachments chunk needs that earlier chunks did not."""
+        runner = self.runner
+        paths = self.paths(chunk)
+        new = set(paths.unique()) - {""} - self.attachments.keys() - self.broken.keys()
+        base_dir = os.path.dirname(os.path.abspath(runner.excel_file))
+        for path in sorted(new):
+            try:
+                # Relative paths in the sheet are relative to the contacts file
+                self.attachments[path] = self.attachment_cache.prepare(os.path.join(base_dir, os.path.expanduser(path)))
+            except AttachmentError as e:
+                self.broken[path] = str(e)
+                self.problems.append(str(e))
+                if self.sending:
+                    runner.progress.post(f"{str(e)}, its contacts are skipped", "error")
+        for note in self.attachment_cache.notes:
+            runner.progress.post(note, "warning")
+        self.attachment_cache.notes.clear()
+        if new - self.broken.keys():
+            files = {attachment.sha256: attachment.size for attachment in self.attachments.values()}
+            runner.progress.post(f"{len(files)} attachments ready ({sum(files.values()) / 2 ** 20:.1f} MB)", "info")
+        broken = paths.isin(self.broken.keys()).to_numpy()
+        if self.sending and broken.any():
+            number_column = runner.number_column
+            for path in paths[broken].unique():
+                rows = paths == path
+                self.campaign.mark_many(chunk[number_column][rows], SKIPPED, self.broken[path])
+                runner.progress.row_status(chunk.index[rows.to_numpy()].tolist(), "skipped: attachment")
+            chunk = chunk[~broken]
+        return chunk
+
+    def finish(self):
+        """Post what was skipped, once the sheet is read (or sending ended early)."""
+        if self.finished:
+            return
+        self.finished = True
+        runner = self.runner
+        if self.rejected:
+            details = ", ".join(f"{count} {reason}" for reason, count in self.rejected.items())
+            runner.progress.post(f"Skipped {sum(self.rejected.values())} rows ({details}). "
+                                 f"Report: {self.report_path}", "warning")
+        for reason, count in self.suppressed.items():
+            runner.progress.post(f"Skipped {count} contacts: {reason}", "warning")
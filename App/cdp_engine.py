@@ -0,0 +1,474 @@
+"""Sending over the Chrome DevTools protocol, from one asyncio event loop.
+
+The Selenium path costs one blocking HTTP round-trip through chromedriver per step. This engine
+talks to Chrome's DevTools websocket directly: commands are pipelined (written back to back,
+answered out of order), chat readiness and ticks come from the page's MutationObserver through
+an awaited promise, and network events count what each page loads. All sessions share one
+event loop on its own thread, so many tabs and browsers are driven concurrently.
+
+SessionManager still starts Chrome and handles the log-in; the engine attaches to that Chrome's
+DevTools endpoint. Needs the optional websockets package.
+"""
+import asyncio
+import itertools
+import json
+import threading
+import urllib.request
+
+from selenium.common.exceptions import TimeoutException, NoSuchElementException
+
+from attachments import DOCUMENT
+from browser_session import BLOCKED_URLS, BrowserUsage
+from metrics import timed, NAVIGATE, OPEN_CHAT, CHAT_READY, ATTACH, CLICK, DELIVERY
+from page_events import (WAIT_FOR_EVENT_JS, MARK_OUTGOING_JS, CHAT_READY as CHAT_READY_EVENT, CHAT_OPEN,
+                         INVALID_NUMBER, MESSAGE_SENT, MESSAGE_QUEUED, InvalidNumberError)
+from transport import Transport, PreparedChat
+from whatsapp_web import send_url, ChatNotOpenedError, DeliveryUnknownError
+
+# Element locators, the same elements whatsapp_web finds by XPath
+SEND_BUTTON_JS = 'document.querySelector(\'#main footer span[data-icon="send"]\')'
+ATTACH_BUTTON_JS = ('document.querySelector(\'#main footer span[data-icon="plus"], #main footer span[data-icon="plus-rounded"], '
+                    '#main footer span[data-icon="attach-menu-plus"], #main footer span[data-icon="clip"]\')')
+MEDIA_INPUT_JS = 'document.querySelector(\'input[type="file"][accept*="image"]\')'
+DOCUMENT_INPUT_JS = 'document.querySelector(\'input[type="file"][accept="*"]\')'
+CAPTION_JS = ('[...document.querySelectorAll(\'div[role="textbox"][contenteditable="true"]\')]'
+              '.find(el => !el.closest("footer") && el.dataset.tab !== "3")')
+PREVIEW_SEND_JS = ('[...document.querySelectorAll(\'span[data-icon="send"], span[data-icon="wds-ic-send-filled"]\')]'
+                   '.find(el => !el.closest("footer"))')
+NEW_CHAT_JS = 'document.querySelector(\'span[data-icon="new-chat-outline"], span[data-icon="chat"]\')'
+SEARCH_BOX_JS = 'document.querySelector(\'div[contenteditable="true"][data-tab="3"]\')'
+SEARCH_RESULT_JS = 'document.querySelector(\'div[role="listitem"] span[title]\')'
+CHAT_TITLE_JS = 'document.querySelector(\'#main header span[dir="auto"]\')'
+COMPOSE_JS = 'document.querySelector(\'#main footer div[role="textbox"][contenteditable="true"]\')'
+
+# Resolves with the element's centre once it exists (scrolled into view), or null after the timeout
+LOCATE_JS = """
+new Promise(resolve => {
+    const deadline = Date.now() + %(timeout_ms)d;
+    (function poll() {
+        const el = %(element)s;
+        if (el) {
+            el.scrollIntoView({block: 'center'});
+            const box = el.getBoundingClientRect();
+            resolve({x: box.left + box.width / 2, y: box.top + box.height / 2});
+        } else if (Date.now() > deadline) {
+            resolve(null);
+        } else {
+            setTimeout(poll, 50);
+        }
+    })();
+})
+"""
+
+
+class CdpError(Exception):
+    """Chrome answered a DevTools command with an error, or the connection went away."""
+
+
+def browser_websocket_url(driver):
+    """DevTools websocket of the Chrome a Selenium driver started."""
+    address = driver.capabilities.get("goog:chromeOptions", {}).get("debuggerAddress")
+    if not address:
+        raise CdpError("Chrome did not expose a DevTools address")
+    with urllib.request.urlopen(f"http://{address}/json/version", timeout=10) as response:
+        return json.load(response)["webSocketDebuggerUrl"]
+
+
+class CdpConnection:
+    """One websocket to a Chrome browser, shared by every tab attached through it.
+
+    send() writes a command and returns a future for its answer without waiting, so commands
+    from one or many tabs are in flight together; a reader task resolves them by id and hands
+    events to listeners by (session id, method).
+    """
+
+    def __init__(self):
+        self.ws = None
+        self.closed = False
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._listeners = {}
+        self._reader = None
+
+    async def connect(self, url):
+        try:
+            import websockets
+        except ImportError:
+            raise CdpError("The DevTools engine needs the websockets package (pip install websockets)")
+        self.ws = await websockets.connect(url, max_size=None, ping_interval=None)
+        self._reader = asyncio.get_running_loop().create_task(self._read())
+        return self
+
+    async def _read(self):
+        error = CdpError("DevTools connection closed")
+        try:
+            async for raw in self.ws:
+                message = json.loads(raw)
+                if "id" in message:
+                    future = self._pending.pop(message["id"], None)
+                    if future is None or future.done():
+                        continue
+                    if "error" in message:
+                        future.set_exception(CdpError(message["error"].get("message", "DevTools error")))
+                    else:
+                        future.set_result(message.get("result", {}))
+                else:
+                    key = (message.get("sessionId"), message.get("method"))
+                    for listener in list(self._listeners.get(key, ())):
+                        listener(message.get("params", {}))
+        except Exception as e:
+            error = CdpError(f"DevTools connection lost: {str(e)}")
+        finally:
+            self.closed = True
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+
+    async def send(self, method, params=None, session_id=None):
+        """Write a command and return the future of its result."""
+        if self.closed:
+            raise CdpError("DevTools connection closed")
+        message_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        message = {"id": message_id, "method": method, "params": params or {}}
+        if session_id:
+            message["sessionId"] = session_id
+        await self.ws.send(json.dumps(message))
+        return future
+
+    async def execute(self, method, params=None, session_id=None, timeout=30):
+        """Send a command and wait for its result."""
+        try:
+            return await asyncio.wait_for(await self.send(method, params, session_id), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutException(f"{method} got no answer within {timeout}s")
+
+    def listen(self, method, listener, session_id=None):
+        """Call listener(params) for every method event; returns a function that stops listening."""
+        listeners = self._listeners.setdefault((session_id, method), set())
+        listeners.add(listener)
+        return lambda: listeners.discard(listener)
+
+    def expect(self, method, session_id=None):
+        """Start listening for the next method event; returns (future of its params, stop function)."""
+        future = asyncio.get_running_loop().create_future()
+        stop = self.listen(method, lambda params: future.done() or future.set_result(params), session_id)
+        return future, stop
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self._reader is not None:
+            await self._reader
+
+
+class CdpTab:
+    """A page target attached in flat mode; its commands and events go over the shared connection."""
+
+    def __init__(self, connection, target_id, session_id):
+        self.connection = connection
+        self.target_id = target_id
+        self.session_id = session_id
+        self.requests = 0  # Counted from Network events since the last navigation
+        self.transferred = 0
+        self.blocked = 0
+        connection.listen("Network.requestWillBeSent", self._on_request, session_id)
+        connection.listen("Network.loadingFinished", self._on_loaded, session_id)
+        connection.listen("Network.loadingFailed", self._on_failed, session_id)
+
+    @classmethod
+    async def attach(cls, connection, target_id, blocked_urls=None):
+        attached = await connection.execute("Target.attachToTarget", {"targetId": target_id, "flatten": True})
+        tab = cls(connection, target_id, attached["sessionId"])
+        # Enabled in one round-trip instead of one per domain
+        commands = [await tab.send("Page.enable"), await tab.send("Runtime.enable"), await tab.send("Network.enable")]
+        if blocked_urls:
+            commands.append(await tab.send("Network.setBlockedURLs", {"urls": list(blocked_urls)}))
+        await asyncio.gather(*commands)
+        return tab
+
+    @classmethod
+    async def open(cls, connection, url="about:blank", blocked_urls=None):
+        """Create a new tab and attach to it."""
+        target = await connection.execute("Target.createTarget", {"url": url})
+        return await cls.attach(connection, target["targetId"], blocked_urls)
+
+    def _on_request(self, params):
+        self.requests += 1
+
+    def _on_loaded(self, params):
+        self.transferred += params.get("encodedDataLength", 0)
+
+    def _on_failed(self, params):
+        if params.get("blockedReason"):
+            self.blocked += 1
+
+    async def send(self, method, params=None):
+        return await self.connection.send(method, params, self.session_id)
+
+    async def execute(self, method, params=None, timeout=30):
+        return await self.connection.execute(method, params, self.session_id, timeout)
+
+    async def navigate(self, url, timeout):
+        """Load url and return once its DOM is ready."""
+        self.requests = self.transferred = self.blocked = 0
+        ready, stop = self.connection.expect("Page.domContentEventFired", self.session_id)
+        try:
+            result = await self.execute("Page.navigate", {"url": url}, timeout)
+            if result.get("errorText"):
+                raise TimeoutException(f"Page did not load: {result['errorText']}")
+            await asyncio.wait_for(ready, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutException(f"Page did not load within {timeout}s")
+        finally:
+            stop()
+
+    async def evaluate(self, expression, timeout=30, by_value=True):
+        result = await self.execute("Runtime.evaluate", {"expression": expression, "awaitPromise": True,
+                                                         "returnByValue": by_value}, timeout)
+        if "exceptionDetails" in result:
+            details = result["exceptionDetails"]
+            raise CdpError(details.get("exception", {}).get("description") or details.get("text", "Script failed"))
+        return result["result"].get("value") if by_value else result["result"]
+
+    async def wait_for(self, events, timeout):
+        """Return the first of page_events' events to occur, or raise TimeoutException."""
+        expression = ("new Promise(resolve => (function() {%s}).call(null, %s, %d, resolve))"
+                      % (WAIT_FOR_EVENT_JS, json.dumps(list(events)), int(timeout * 1000)))
+        event = await self.evaluate(expression, timeout + 5)
+        if event == "timeout":
+            raise TimeoutException(f"None of {', '.join(events)} within {timeout}s")
+        return event
+
+    async def locate(self, element_js, timeout):
+        point = await self.evaluate(LOCATE_JS % {"element": element_js, "timeout_ms": int(timeout * 1000)}, timeout + 5)
+        if point is None:
+            raise NoSuchElementException(f"Element not found: {element_js}")
+        return point
+
+    async def click(self, element_js, timeout=5, before_js=None):
+        """Click an element with real mouse events; before_js runs in the same round-trip as the lookup."""
+        if before_js:
+            before = await self.send("Runtime.evaluate", {"expression": before_js})
+            point = await self.locate(element_js, timeout)
+            await before
+        else:
+            point = await self.locate(element_js, timeout)
+        mouse = {"x": point["x"], "y": point["y"], "button": "left", "clickCount": 1}
+        pressed = await self.send("Input.dispatchMouseEvent", {"type": "mousePressed", **mouse})
+        released = await self.send("Input.dispatchMouseEvent", {"type": "mouseReleased", **mouse})
+        await asyncio.gather(pressed, released)
+
+    async def insert_text(self, element_js, text, timeout=5):
+        """Replace the text of a contenteditable the way typing would."""
+        await self.evaluate(f"(() => {{ const el = {element_js}; el.focus(); "
+                            f"document.execCommand('selectAll', false, null); }})()", timeout)
+        await self.execute("Input.insertText", {"text": text}, timeout)
+
+    async def set_file(self, element_js, path, timeout=5):
+        await self.locate(element_js, timeout)
+        element = await self.evaluate(element_js, timeout, by_value=False)
+        await self.execute("DOM.setFileInputFiles", {"files": [path], "objectId": element["objectId"]}, timeout)
+
+    async def close(self):
+        await self.connection.execute("Target.closeTarget", {"targetId": self.target_id})
+
+
+class CdpSender:
+    """The /send?phone= flow of whatsapp_web.open_chat_by_navigation and click_send, on a CdpTab."""
+
+    def __init__(self, tab, base_url, timeout=15, confirm_timeout=10, upload_timeout=120, metrics=None):
+        self.tab = tab
+        self.base_url = base_url
+        self.timeout = timeout
+        self.confirm_timeout = confirm_timeout
+        self.upload_timeout = upload_timeout
+        self.metrics = metrics
+
+    async def prepare(self, number, message, attachment=None):
+        """Load the chat (and attach the file); returns the send button's JS for click_send."""
+        tab = self.tab
+        with timed(self.metrics, NAVIGATE):
+            await tab.navigate(send_url(number, "" if attachment else message, self.base_url), self.timeout)
+        with timed(self.metrics, CHAT_READY):
+            event = await tab.wait_for((CHAT_OPEN if attachment else CHAT_READY_EVENT, INVALID_NUMBER), self.timeout)
+            if event == INVALID_NUMBER:
+                raise InvalidNumberError(f"{number} is not a valid WhatsApp number")
+        if not attachment:
+            return SEND_BUTTON_JS
+        with timed(self.metrics, ATTACH):
+            return await self.attach(attachment, message)
+
+    async def attach(self, attachment, caption):
+        """Attach the file to the open chat; returns the preview's send button JS."""
+        tab = self.tab
+        await tab.click(ATTACH_BUTTON_JS, self.timeout)
+        await tab.set_file(DOCUMENT_INPUT_JS if attachment.kind == DOCUMENT else MEDIA_INPUT_JS,
+                           attachment.path, self.timeout)
+        if caption:
+            await tab.locate(CAPTION_JS, self.timeout)
+            await tab.insert_text(CAPTION_JS, caption)
+        return PREVIEW_SEND_JS
+
+    async def click_send(self, send_button, attachment=None):
+        with timed(self.metrics, CLICK):
+            await self.tab.click(send_button, self.timeout, before_js=MARK_OUTGOING_JS)
+        with timed(self.metrics, DELIVERY):
+            try:
+                return await self.wait_delivery(self.upload_timeout if attachment else self.confirm_timeout)
+            except Exception as e:
+                raise DeliveryUnknownError(str(e)) from e
+
+    async def wait_delivery(self, timeout):
+        try:
+            await self.tab.wait_for((MESSAGE_SENT,), timeout)
+            return "sent"
+        except TimeoutException:
+            if await self.tab.wait_for((MESSAGE_SENT, MESSAGE_QUEUED), 0.1) == MESSAGE_SENT:
+                return "sent"
+            return "queued"
+
+
+class CdpInPageSender(CdpSender):
+    """whatsapp_web.InPageSender on a CdpTab: opens each chat from the new-chat search, no page load.
+
+    prepare() raises ChatNotOpenedError (or InvalidNumberError) when the chat could not be
+    opened, and the caller falls back to CdpSender's navigation.
+    """
+
+    async def open_chat(self, number):
+        tab = self.tab
+        await tab.click(NEW_CHAT_JS, self.timeout)
+        await tab.locate(SEARCH_BOX_JS, self.timeout)
+        await tab.insert_text(SEARCH_BOX_JS, number)
+        await tab.click(SEARCH_RESULT_JS, self.timeout)
+        await tab.locate(CHAT_TITLE_JS, self.timeout)
+        title = await tab.evaluate(f"{CHAT_TITLE_JS}.textContent", self.timeout) or ""
+        if "".join(ch for ch in title if ch.isdigit()) != number:
+            raise LookupError(f"In-page search opened '{title}' instead of {number}")
+
+    async def prepare(self, number, message, attachment=None):
+        tab = self.tab
+        try:
+            with timed(self.metrics, OPEN_CHAT):
+                await self.open_chat(number)
+                await tab.locate(COMPOSE_JS, self.timeout)
+                if not attachment:
+                    await tab.insert_text(COMPOSE_JS, message)
+            with timed(self.metrics, CHAT_READY):
+                event = await tab.wait_for((CHAT_OPEN if attachment else CHAT_READY_EVENT, INVALID_NUMBER),
+                                           self.timeout)
+                if event == INVALID_NUMBER:
+                    raise InvalidNumberError(f"{number} is not a valid WhatsApp number")
+            if not attachment:
+                return SEND_BUTTON_JS
+            with timed(self.metrics, ATTACH):
+                return await self.attach(attachment, message)
+        except InvalidNumberError:
+            raise
+        except Exception as e:
+            raise ChatNotOpenedError(str(e)) from e
+
+
+class CdpEngine:
+    """The event loop every DevTools connection runs on, on a thread of its own."""
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="cdp-engine", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def shared(cls):
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def run(self, coroutine, timeout=None):
+        """Run a coroutine on the engine's loop and block the calling thread for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+
+class CdpTransport(Transport):
+    """Sends through a SessionManager's Chrome over DevTools instead of chromedriver.
+
+    The Selenium driver keeps the browser alive and logged in; sending happens on its WhatsApp
+    tab, attached over this transport's own DevTools connection (WhatsApp Web allows only one
+    active tab per browser). With send_mode "in_page" chats are opened from the new-chat search
+    first, falling back to navigation like WebTransport.
+    """
+
+    max_prepared = 1
+
+    def __init__(self, session, send_mode="navigate", metrics=None, engine=None):
+        self.session = session
+        self.send_mode = send_mode
+        self.metrics = metrics
+        self.engine = engine or CdpEngine.shared()
+        self.connection = None
+        self.tab = None
+        self.sender = None
+        self.in_page = None
+
+    def connect(self, status):
+        driver = self.session.get_driver(status)
+        self.close()
+        url = browser_websocket_url(driver)
+        self.connection = self.engine.run(CdpConnection().connect(url))
+        blocked = BLOCKED_URLS if self.session.headless and self.session.lean else None
+        self.tab = self.engine.run(self._attach_whatsapp(blocked))
+        self.sender = CdpSender(self.tab, self.session.base_url, metrics=self.metrics)
+        if self.send_mode == "in_page":
+            self.in_page = CdpInPageSender(self.tab, self.session.base_url, timeout=5, metrics=self.metrics)
+
+    async def _attach_whatsapp(self, blocked_urls):
+        targets = (await self.connection.execute("Target.getTargets"))["targetInfos"]
+        pages = [target for target in targets if target["type"] == "page"]
+        if not pages:
+            return await CdpTab.open(self.connection, self.session.base_url, blocked_urls)
+        page = next((target for target in pages if target["url"].startswith(self.session.base_url)), pages[0])
+        return await CdpTab.attach(self.connection, page["targetId"], blocked_urls)
+
+    def send(self, number, message, attachment=None):
+        return self.send_prepared(self.prepare(number, message, attachment))
+
+    def prepare(self, number, message, attachment=None):
+        if self.in_page:
+            try:
+                return PreparedChat(number, message, attachment,
+                                    self.engine.run(self.in_page.prepare(number, message, attachment)))
+            except ChatNotOpenedError:
+                pass  # Chat could not be opened in-page, fall back to a full page load
+        return PreparedChat(number, message, attachment, self.engine.run(self.sender.prepare(number, message, attachment)))
+
+    def send_prepared(self, chat):
+        return self.engine.run(self.sender.click_send(chat.handle, chat.attachment))
+
+    def is_alive(self):
+        return self.connection is not None and not self.connection.closed and self.session.is_alive()
+
+    def usage(self):
+        usage = self.session.usage()
+        if usage is None or self.tab is None:
+            return usage
+        # What the last page loaded, from Network events rather than the page's own timing entries
+        return BrowserUsage(usage.rss, self.tab.requests, self.tab.transferred)
+
+    def recycle(self, status):
+        self.close()
+        self.session.close()
+        self.connect(status)
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.engine.run(self.connection.close(), 10)
+            except Exception:
+                pass
+        self.connection = self.tab = self.sender = self.in_page = None
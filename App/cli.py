@@ -0,0 +1,157 @@
+"""Run a WhatsApp campaign without the GUI, streaming progress as JSON lines.
+
+    python cli.py contacts.xlsx --template "Hello {name}" --delay 10 --sessions 2
+
+Every line on stdout is a JSON object with an "event" field: "log", "contact" (sheet rows and
+their new status), "progress" (counts, rate and ETA), "metrics" (per-phase timings) and a
+final "finished".
+
+Exit codes: 0 all sent, 1 finished with failed contacts, 2 invalid input, 3 no browser
+session could be started or the run failed, 130 stopped (Ctrl+C or SIGTERM).
+"""
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+
+from contacts import ContactStore, SUPPORTED_EXTENSIONS
+from campaign_journal import CampaignJournal
+from send_history import SendHistory
+from campaign_runner import CampaignRunner, COMPLETED, STOPPED, INVALID_INPUT
+from browser_watchdog import RecyclePolicy
+from transport import ENGINES, SELENIUM
+
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_INVALID_INPUT = 2
+EXIT_ERROR = 3
+EXIT_STOPPED = 130
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Send a WhatsApp campaign from a contacts file, without the GUI.")
+    parser.add_argument("contacts", help="Excel or CSV file with 'Customers Name' and 'Whatsapp Number' columns")
+    template = parser.add_mutually_exclusive_group()
+    template.add_argument("--template", help="Message template, e.g. 'Hello {name}'; defaults to the Message column")
+    template.add_argument("--template-file", help="Read the message template from this UTF-8 text file")
+    parser.add_argument("--attachment", help="File sent to every contact, with the message as its caption; "
+                                             "defaults to the Attachment column")
+    parser.add_argument("--as-document", action="store_true", help="Send photos and videos uncompressed, as documents")
+    parser.add_argument("--delay", type=int, default=10, help="Minimum seconds between messages per session (default 10)")
+    parser.add_argument("--per-minute", type=int, help="Maximum messages per minute per session")
+    parser.add_argument("--per-hour", type=int, help="Maximum messages per hour per session")
+    parser.add_argument("--sessions", type=int, default=1, help="Parallel WhatsApp sessions, one account each (default 1)")
+    parser.add_argument("--in-page", action="store_true", help="Open chats inside WhatsApp Web instead of reloading it")
+    parser.add_argument("--engine", choices=ENGINES, default=SELENIUM,
+                        help="Drive Chrome through chromedriver (selenium) or over the DevTools protocol "
+                             "(devtools, needs the websockets package)")
+    parser.add_argument("--prefetch", type=int, default=0,
+                        help="Load the next chat while waiting to send the current one (WhatsApp Web holds one "
+                             "chat ready per session), 0 to send strictly one at a time (default 0)")
+    parser.add_argument("--full-browser", action="store_true",
+                        help="Let the headless browser load images, media and fonts (lean profile is the default)")
+    parser.add_argument("--max-browser-mb", type=int, default=1500,
+                        help="Restart a session's browser when Chrome uses more memory than this (default 1500)")
+    parser.add_argument("--restart-browser-every", type=int,
+                        help="Also restart each session's browser after this many messages")
+    parser.add_argument("--country-code", default="", help="Country code added to local numbers")
+    parser.add_argument("--skip-recent-days", type=int, help="Skip numbers messaged by any campaign within this many days")
+    parser.add_argument("--restart", action="store_true", help="Start the campaign over instead of resuming it")
+    parser.add_argument("--metrics-dir", help="Where to write the timing exports (JSON, CSV, Prometheus textfile)")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between progress lines (default 1)")
+    args = parser.parse_args(argv)
+    if args.sessions < 1:
+        parser.error("--sessions must be at least 1")
+    if args.delay < 0:
+        parser.error("--delay cannot be negative")
+    for option, value in (("--per-minute", args.per_minute), ("--per-hour", args.per_hour)):
+        if value is not None and value < 1:
+            parser.error(f"{option} must be at least 1")
+    return args
+
+
+def emit(event, **fields):
+    print(json.dumps({"event": event, "time": round(time.time(), 3), **fields}, ensure_ascii=False, default=str),
+          flush=True)
+
+
+def emit_snapshot(snapshot, last_counts):
+    for message, status_type in snapshot.events:
+        emit("log", level=status_type, message=message)
+    if snapshot.dropped:
+        emit("log", level="warning", message=f"{snapshot.dropped} progress messages were dropped")
+    for rows, status in snapshot.statuses:
+        emit("contact", rows=rows, status=status)
+    counts = (snapshot.total, snapshot.sent, snapshot.failed)
+    if counts != last_counts:
+        emit("progress", total=snapshot.total, sent=snapshot.sent, failed=snapshot.failed, pending=snapshot.pending,
+             per_minute=round(snapshot.per_minute, 2), eta=None if snapshot.eta is None else round(snapshot.eta))
+    return counts
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.path.isfile(args.contacts) or not args.contacts.lower().endswith(SUPPORTED_EXTENSIONS):
+        emit("finished", success=False, status=INVALID_INPUT, message=f"Not a contacts file: {args.contacts}")
+        return EXIT_INVALID_INPUT
+    template = args.template
+    if args.template_file:
+        try:
+            with open(args.template_file, encoding="utf-8") as f:
+                template = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            emit("finished", success=False, status=INVALID_INPUT, message=f"Cannot read the template file: {str(e)}")
+            return EXIT_INVALID_INPUT
+
+    from browser_session import SessionManager, worker_profile_path
+    sessions = [SessionManager(worker_profile_path(i), lean=not args.full_browser)
+                for i in range(args.sessions)]
+    journal = CampaignJournal()
+    history = SendHistory()
+    runner = CampaignRunner(args.contacts, args.delay, ContactStore(), template or None, args.country_code,
+                            sessions, "in_page" if args.in_page else "navigate", args.per_minute, args.per_hour,
+                            journal, not args.restart, history, args.skip_recent_days, args.metrics_dir,
+                            RecyclePolicy(args.max_browser_mb, max_messages=args.restart_browser_every),
+                            args.attachment, args.as_document, args.engine, max(0, args.prefetch))
+
+    results = []
+    worker = threading.Thread(target=lambda: results.append(runner.run()), name="campaign", daemon=True)
+    signal.signal(signal.SIGTERM, lambda signum, frame: runner.stop())
+    worker.start()
+
+    last_counts = None
+    try:
+        while worker.is_alive():
+            worker.join(args.interval)
+            last_counts = emit_snapshot(runner.progress.snapshot(), last_counts)
+    except KeyboardInterrupt:
+        runner.stop()
+        worker.join()
+    finally:
+        for session in sessions:
+            session.close()
+        journal.close()
+        history.close()
+
+    emit_snapshot(runner.progress.snapshot(), last_counts)
+    emit("metrics", phases=runner.metrics.snapshot())
+    result = results[0] if results else None
+    if result is None:
+        emit("finished", success=False, status=STOPPED, message="Process was stopped by user")
+        return EXIT_STOPPED
+    emit("finished", success=result.success, status=result.status, message=result.message,
+         sent=runner.progress.sent, failed=runner.progress.failed)
+    if result.status == COMPLETED:
+        return EXIT_FAILURES if runner.progress.failed else EXIT_OK
+    if result.status == STOPPED:
+        return EXIT_STOPPED
+    if result.status == INVALID_INPUT:
+        return EXIT_INVALID_INPUT
+    return EXIT_ERROR
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+import os
+import csv
+import hashlib
+import threading
+from collections import namedtuple, OrderedDict
+
+from app_paths import data_dir
+
+# Default column names
+NAME_COLUMN = "Customers Name"
+NUMBER_COLUMN = "Whatsapp Number"
+MESSAGE_COLUMN = "Message"
+ATTACHMENT_COLUMN = "Attachment"  # Optional: path of a file to send with the message
+
+SUPPORTED_EXTENSIONS = ('.xlsx', '.xlsm', '.xls', '.csv')
+
+# One compact record per sheet row, instead of a pandas Series per row.
+# values holds every cell of the row as text, in header order, for template placeholders.
+Contact = namedtuple("Contact", ["row", "name", "number", "message", "values"])
+
+
+def cell_text(value):
+    """Convert a raw cell value to text, treating empty cells as ''."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value != value:  # NaN
+        return ""
+    return str(value)
+
+
+def _iter_xlsx_rows(path):
+    from openpyxl import load_workbook
+
+    # read_only mode parses the sheet XML lazily, one row at a time
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        for values in sheet.iter_rows(values_only=True):
+            yield values
+    finally:
+        workbook.close()
+
+
+def _iter_csv_rows(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for values in csv.reader(f):
+            yield values
+
+
+def _iter_xls_rows(path, chunk_size=5000):
+    # Legacy .xls has no streaming reader; read it once and hand out rows
+    import pandas as pd
+
+    df = pd.read_excel(path, header=None, dtype=object)
+    for start in range(0, len(df), chunk_size):
+        for values in df.iloc[start:start + chunk_size].itertuples(index=False, name=None):
+            yield values
+
+
+def iter_rows(path):
+    """Yield the raw rows (header included) of the first sheet of a contacts file."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        return _iter_csv_rows(path)
+    if ext == ".xls":
+        return _iter_xls_rows(path)
+    return _iter_xlsx_rows(path)
+
+
+def count_rows(path):
+    """Return the number of data rows (header excluded) without parsing the cells, or None if unknown."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        with open(path, "rb") as f:
+            lines = sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+        return max(lines - 1, 0)
+    if ext == ".xls":
+        return None
+
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True)
+    try:
+        max_row = workbook.worksheets[0].max_row  # taken from the sheet <dimension> tag
+    finally:
+        workbook.close()
+    return max(max_row - 1, 0) if max_row else None
+
+
+def _header_names(header):
+    return [cell_text(h).strip() or f"Column {i + 1}" for i, h in enumerate(header)]
+
+
+def read_header(path):
+    """Return the column names of a contacts file, reading only its first row."""
+    rows = iter_rows(path)
+    try:
+        header = next(rows, None)
+    finally:
+        rows.close()
+    if header is None:
+        return []
+    return _header_names(header)
+
+
+def iter_contacts(path, name_column=NAME_COLUMN, number_column=NUMBER_COLUMN,
+                  message_column=MESSAGE_COLUMN):
+    """Stream Contact records from an .xlsx/.xls/.csv file without loading the whole sheet."""
+    rows = iter_rows(path)
+    header = next(rows, None)
+    if header is None:
+        return
+    header = _header_names(header)
+
+    for col in (name_column, number_column):
+        if col not in header:
+            raise ValueError(f"Column '{col}' not found in {os.path.basename(path)}")
+    name_idx = header.index(name_column)
+    number_idx = header.index(number_column)
+    message_idx = header.index(message_column) if message_column in header else None
+
+    width = len(header)
+    for row_number, values in enumerate(rows, start=1):
+        if not any(v is not None and v != "" for v in values):
+            continue  # skip blank rows
+        texts = tuple(cell_text(values[i]) if i < len(values) else "" for i in range(width))
+        message = texts[message_idx] if message_idx is not None else ""
+        yield Contact(row_number, texts[name_idx], texts[number_idx], message, texts)
+
+
+def read_table(path):
+    """Parse a whole contacts file into a DataFrame of text columns, indexed by data row number."""
+    import pandas as pd
+
+    rows = iter_rows(path)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+    header = _header_names(header)
+
+    columns = [[] for _ in header]
+    row_numbers = []
+    for row_number, values in enumerate(rows, start=1):
+        if not any(v is not None and v != "" for v in values):
+            continue  # skip blank rows
+        row_numbers.append(row_number)
+        for i, column in enumerate(columns):
+            column.append(cell_text(values[i]) if i < len(values) else "")
+
+    return pd.DataFrame(dict(zip(header, columns)), index=pd.Index(row_numbers, name="row"), dtype=object)
+
+
+def table_contacts(df, name_column=NAME_COLUMN, number_column=NUMBER_COLUMN,
+                   message_column=MESSAGE_COLUMN):
+    """Yield Contact records from a parsed contacts table."""
+    for col in (name_column, number_column):
+        if col not in df.columns:
+            raise ValueError(f"Column '{col}' not found in Excel file")
+    name_idx = df.columns.get_loc(name_column)
+    number_idx = df.columns.get_loc(number_column)
+    message_idx = df.columns.get_loc(message_column) if message_column in df.columns else None
+    for row, values in zip(df.index, df.itertuples(index=False, name=None)):
+        message = values[message_idx] if message_idx is not None else ""
+        yield Contact(row, values[name_idx], values[number_idx], message, values)
+
+
+def default_cache_dir():
+    return data_dir("cache")
+
+
+class ContactStore:
+    """Parses each contacts file once and shares the table between the UI and the sender thread.
+
+    Entries are keyed by absolute path and validated against the file's mtime and size, so an
+    edited file is parsed again. When pyarrow is installed the parsed table is also kept as a
+    Parquet sidecar in the cache directory, which makes reopening a large sheet almost instant.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=4, use_sidecar=True):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_entries = max_entries
+        self.use_sidecar = use_sidecar
+        self._entries = OrderedDict()  # path -> (signature, DataFrame)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def signature(path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _sidecar_prefix(self, path):
+        return os.path.join(self.cache_dir, hashlib.sha1(path.encode("utf-8")).hexdigest())
+
+    def _sidecar_path(self, path, signature):
+        return f"{self._sidecar_prefix(path)}-{signature[0]}-{signature[1]}.parquet"
+
+    def _read_sidecar(self, path, signature):
+        import pandas as pd
+
+        sidecar = self._sidecar_path(path, signature)
+        if not os.path.exists(sidecar):
+            return None
+        try:
+            return pd.read_parquet(sidecar)
+        except Exception:
+            return None
+
+    def _write_sidecar(self, path, signature, df):
+        self._remove_sidecars(path)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            df.to_parquet(self._sidecar_path(path, signature))
+        except (ImportError, OSError, ValueError):
+            pass  # no parquet engine or unwritable cache dir, keep the in-memory entry only
+
+    def _remove_sidecars(self, path):
+        prefix = os.path.basename(self._sidecar_prefix(path))
+        if not os.path.isdir(self.cache_dir):
+            return
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.startswith(prefix):
+                try:
+                    os.remove(os.path.join(self.cache_dir, file_name))
+                except OSError:
+                    pass
+
+    def load(self, path):
+        """Return the parsed table for path, parsing the file only if it changed since the last load."""
+        path = os.path.abspath(path)
+        signature = self.signature(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == signature:
+                self._entries.move_to_end(path)
+                return entry[1]
+
+            df = self._read_sidecar(path, signature) if self.use_sidecar else None
+            if df is None:
+                df = read_table(path)
+                if self.use_sidecar:
+                    self._write_sidecar(path, signature, df)
+
+            self._entries[path] = (signature, df)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return df
+
+    def cached(self, path):
+        """The parsed table of path if it is in memory and still current, else None (nothing is parsed)."""
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry and entry[0] == self.signature(path):
+            return entry[1]
+        return None
+
+    def iter_contacts(self, path, name_column=NAME_COLUMN, number_column=NUMBER_COLUMN,
+                      message_column=MESSAGE_COLUMN):
+        """Yield contacts from the cached table, streaming straight from the file on a cache miss."""
+        df = self.cached(path)
+        if df is not None:
+            return table_contacts(df, name_column, number_column, message_column)
+        return iter_contacts(path, name_column, number_column, message_column)
+
+    def columns(self, path):
+        """Column names of path, from the cache when possible."""
+        df = self.cached(path)
+        return list(df.columns) if df is not None else read_header(path)
+
+    def count(self, path):
+        """Number of contacts in path, from the cache when possible."""
+        df = self.cached(path)
+        return len(df) if df is not None else count_rows(path)
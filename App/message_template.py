@@ -0,0 +1,229 @@
+import re
+from functools import lru_cache
+from itertools import repeat
+
+from contacts import NAME_COLUMN, NUMBER_COLUMN, MESSAGE_COLUMN, cell_text
+
+# Short placeholder names that map to the default sheet columns
+DEFAULT_ALIASES = {
+    "name": NAME_COLUMN,
+    "number": NUMBER_COLUMN,
+    "phone": NUMBER_COLUMN,
+}
+
+# {Column}, {Column:formatter}, {Column|default}, {Column:formatter|default}; {{ and }} are literal braces
+PLACEHOLDER_RE = re.compile(r"\{\{|\}\}|\{([^{}:|]+)(?::([A-Za-z_]+))?(?:\|([^{}]*))?\}")
+
+
+def _first_word(value):
+    words = value.split()
+    return words[0] if words else ""
+
+
+FORMATTERS = {
+    "upper": str.upper,
+    "lower": str.lower,
+    "title": str.title,
+    "strip": str.strip,
+    "first": _first_word,
+}
+
+
+class Slot:
+    __slots__ = ("field", "formatter", "default", "raw")
+
+    def __init__(self, field, formatter, default, raw):
+        self.field = field
+        self.formatter = formatter
+        self.default = default
+        self.raw = raw
+
+
+class MessageTemplate:
+    """A message template compiled once into a fixed list of literal strings and field slots.
+
+    Placeholders are ``{Column}`` for any sheet column (``{name}`` and ``{number}`` are aliases
+    for the default columns), ``{Column:upper}`` to apply a formatter
+    (upper, lower, title, strip, first) and ``{Column|text}`` for a default used when the cell
+    is empty. Unknown columns are left in the message as written.
+    """
+
+    def __init__(self, text, aliases=None):
+        self.text = text
+        self.aliases = DEFAULT_ALIASES if aliases is None else aliases
+        self.parts = self._compile(text)
+
+    @staticmethod
+    def _compile(text):
+        parts = []
+        literal = []
+        pos = 0
+        for match in PLACEHOLDER_RE.finditer(text):
+            literal.append(text[pos:match.start()])
+            pos = match.end()
+            token = match.group(0)
+            if token in ("{{", "}}"):
+                literal.append(token[0])
+                continue
+            field, formatter, default = match.group(1).strip(), match.group(2), match.group(3)
+            if formatter is not None and formatter.lower() not in FORMATTERS:
+                literal.append(token)  # not a placeholder we understand
+                continue
+            parts.append("".join(literal))
+            literal = []
+            parts.append(Slot(field, formatter and formatter.lower(), default, token))
+        literal.append(text[pos:])
+        parts.append("".join(literal))
+        return [p for p in parts if p != ""]
+
+    @property
+    def fields(self):
+        return [p.field for p in self.parts if isinstance(p, Slot)]
+
+    def resolve(self, field, columns):
+        """Return the column a placeholder refers to, or None if the sheet has no such column."""
+        if field in columns:
+            return field
+        alias = self.aliases.get(field.lower())
+        if alias in columns:
+            return alias
+        lowered = {str(c).lower(): c for c in columns}
+        return lowered.get(field.lower())
+
+    def missing_fields(self, columns):
+        return [f for f in self.fields if self.resolve(f, columns) is None]
+
+    def bind(self, columns):
+        """Resolve the slots against a header so rows can be rendered from plain value tuples."""
+        columns = list(columns)
+        plan = []
+        for part in self.parts:
+            if isinstance(part, str):
+                plan.append(part)
+                continue
+            column = self.resolve(part.field, columns)
+            if column is None:
+                plan.append(part.raw)
+            else:
+                plan.append((columns.index(column), FORMATTERS[part.formatter] if part.formatter else None,
+                             part.default))
+        return BoundTemplate(_merge_literals(plan))
+
+    def render_columns(self, df):
+        """Render one message per DataFrame row, working on whole columns at a time."""
+        import numpy as np
+        import pandas as pd
+
+        pieces = []
+        for part in self.parts:
+            if isinstance(part, str):
+                piece = part
+            else:
+                column = self.resolve(part.field, df.columns)
+                if column is None:
+                    piece = part.raw
+                elif part.formatter is None and part.default is None:
+                    piece = df[column].to_numpy(dtype=object, copy=True)
+                    piece[pd.isna(piece)] = ""
+                    if pd.api.types.infer_dtype(piece, skipna=False) != "string":
+                        piece = np.array([cell_text(v) for v in piece], dtype=object)
+                else:
+                    # Format each distinct value once, then spread the results back over the rows;
+                    # empty cells get code -1, which picks the trailing formatted "" entry
+                    codes, uniques = pd.factorize(df[column].to_numpy(dtype=object))
+                    formatted = [_format_value(cell_text(u), part) for u in uniques]
+                    formatted.append(_format_value("", part))
+                    piece = np.array(formatted, dtype=object)[codes]
+            pieces.append(repeat(piece, len(df)) if isinstance(piece, str) else piece)
+
+        # One join per row over the prepared columns, instead of one concatenation pass per part
+        if not pieces:
+            return pd.Series("", index=df.index, dtype=object)
+        if len(pieces) == 1:
+            return pd.Series(list(pieces[0]), index=df.index, dtype=object)
+        return pd.Series(list(map("".join, zip(*pieces))), index=df.index, dtype=object)
+
+
+def _format_value(value, slot):
+    if slot.formatter:
+        value = FORMATTERS[slot.formatter](value)
+    if slot.default is not None and not value.strip():
+        value = slot.default
+    return value
+
+
+class BoundTemplate:
+    __slots__ = ("plan", "constant")
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.constant = plan[0] if len(plan) == 1 and isinstance(plan[0], str) else None
+
+    def render(self, values):
+        if self.constant is not None:
+            return self.constant
+        out = []
+        for part in self.plan:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            index, formatter, default = part
+            value = values[index] if index < len(values) else ""
+            if formatter:
+                value = formatter(value)
+            if default is not None and not value.strip():
+                value = default
+            out.append(value)
+        return "".join(out)
+
+
+def _merge_literals(plan):
+    merged = []
+    for part in plan:
+        if isinstance(part, str) and merged and isinstance(merged[-1], str):
+            merged[-1] += part
+        else:
+            merged.append(part)
+    return merged or [""]
+
+
+# Above this many distinct Message texts, grouping by text costs more than rendering per row
+MAX_GROUPED_TEMPLATES = 256
+
+
+@lru_cache(maxsize=1024)
+def compile_template(text):
+    """Compile a template, reusing the result for repeated texts (e.g. a shared Message column)."""
+    return MessageTemplate(text)
+
+
+def render_messages(df, template=None, message_column=MESSAGE_COLUMN):
+    """Render a message for every row: from template if given, else from each row's own Message cell."""
+    import pandas as pd
+
+    if template:
+        return compile_template(template).render_columns(df)
+    if message_column not in df.columns or not len(df):
+        return pd.Series("", index=df.index, dtype=object)
+
+    # Rows usually share a handful of distinct message texts, render each group at once
+    result = pd.Series("", index=df.index, dtype=object)
+    codes, texts = pd.factorize(df[message_column].to_numpy(dtype=object))
+    if len(texts) > MAX_GROUPED_TEMPLATES:
+        # Mostly one-off messages: render row by row from compiled, header-bound templates
+        columns = list(df.columns)
+        bound = {}
+        messages = []
+        for code, values in zip(codes, df.itertuples(index=False, name=None)):
+            if code < 0:
+                messages.append("")
+                continue
+            if code not in bound:
+                bound[code] = MessageTemplate(cell_text(texts[code])).bind(columns)
+            messages.append(bound[code].render(tuple(cell_text(v) for v in values)))
+        return pd.Series(messages, index=df.index, dtype=object)
+
+    for code, text in enumerate(texts):
+        rows = codes == code
+        result[rows] = compile_template(cell_text(text)).render_columns(df[rows]).to_numpy()
+    return result
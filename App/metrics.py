@@ -0,0 +1,173 @@
+import csv
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from app_paths import data_dir
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# Phases recorded by the pipeline, in the order they happen
+LOAD_CONTACTS = "load_contacts"
+VALIDATE_NUMBERS = "validate_numbers"
+FILTER_CONTACTS = "filter_contacts"
+PREPARE_ATTACHMENTS = "prepare_attachments"
+SESSION_START = "session_start"
+BROWSER_RECYCLE = "browser_recycle"
+RATE_WAIT = "rate_wait"
+RENDER = "render"
+NAVIGATE = "navigate"
+OPEN_CHAT = "open_chat"
+CHAT_READY = "chat_ready"
+ATTACH = "attach"
+CLICK = "click"
+DELIVERY = "delivery"
+SEND = "send"
+
+PHASES = (LOAD_CONTACTS, VALIDATE_NUMBERS, FILTER_CONTACTS, PREPARE_ATTACHMENTS, SESSION_START, BROWSER_RECYCLE,
+          RATE_WAIT, RENDER, NAVIGATE, OPEN_CHAT, CHAT_READY, ATTACH, CLICK, DELIVERY, SEND)
+
+
+def default_metrics_dir():
+    return data_dir("metrics")
+
+
+class Histogram:
+    """Count, sum, min/max and cumulative bucket counts of one phase's durations."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(BUCKETS) + 1)  # last one is +Inf
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket, like Prometheus does."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, count in enumerate(self.buckets):
+            upper = BUCKETS[i] if i < len(BUCKETS) else self.max
+            if count and seen + count >= rank:
+                value = lower + (upper - lower) * (rank - seen) / count
+                return min(max(value, self.min), self.max)
+            seen += count
+            lower = upper
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else None,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": list(self.buckets),
+        }
+
+
+class Metrics:
+    """Per-campaign timings of every pipeline phase, on the monotonic clock.
+
+    Recording is thread-safe and cheap (a lock and a few additions per observation), so every
+    send can be timed. snapshot() is what the GUI shows; write_* export it for later analysis
+    or for a node exporter's textfile collector.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.histograms = {}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def observe(self, phase, seconds):
+        with self._lock:
+            histogram = self.histograms.get(phase)
+            if histogram is None:
+                histogram = self.histograms[phase] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, phase):
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.observe(phase, self.clock() - started)
+
+    def snapshot(self):
+        """Return {phase: summary dict}, phases in pipeline order."""
+        with self._lock:
+            summaries = {phase: histogram.summary() for phase, histogram in self.histograms.items()}
+        order = {phase: i for i, phase in enumerate(PHASES)}
+        return dict(sorted(summaries.items(), key=lambda item: order.get(item[0], len(PHASES))))
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps({"started_at": self.started_at, "phases": self.snapshot()}, indent=2))
+
+    def write_csv(self, path):
+        fields = ["phase", "count", "total", "mean", "min", "max", "p50", "p90", "p99"]
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fields, extrasaction="ignore")
+            writer.writeheader()
+            for phase, summary in self.snapshot().items():
+                writer.writerow({"phase": phase, **summary})
+
+    def prometheus_text(self, prefix="whatsapp_sender"):
+        lines = [f"# HELP {prefix}_phase_seconds Time spent in each phase of the sending pipeline.",
+                 f"# TYPE {prefix}_phase_seconds histogram"]
+        for phase, summary in self.snapshot().items():
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, "+Inf"), summary["buckets"]):
+                cumulative += count
+                lines.append(f'{prefix}_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_phase_seconds_sum{{phase="{phase}"}} {summary["total"]}')
+            lines.append(f'{prefix}_phase_seconds_count{{phase="{phase}"}} {summary["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        # Written to a temp file and renamed, so a scraper never reads half a file
+        _write_atomic(path, self.prometheus_text())
+
+    def export_periodically(self, path, stopped, interval=15.0):
+        """Rewrite the Prometheus file every interval seconds until stopped (an Event) is set."""
+        def loop():
+            while not stopped.wait(interval):
+                self.write_prometheus(path)
+
+        thread = threading.Thread(target=loop, name="metrics-export", daemon=True)
+        thread.start()
+        return thread
+
+
+def timed(metrics, phase):
+    """metrics.time(phase), or a no-op when metrics is None."""
+    return metrics.time(phase) if metrics is not None else nullcontext()
+
+
+def _write_atomic(path, text):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
@@ -0,0 +1,249 @@
+"""Local stand-in for WhatsApp Web, so sending can be measured and tested offline.
+
+Serves the app shell at / (with the logged-in textbox SessionManager looks for) and a
+/send?phone=&text= chat page with the same markup the sender and PageEvents rely on: the
+compose textbox, the send button and outgoing messages that get their tick. Latency and
+failures (invalid number popup, chat that never loads, message stuck on the clock) are
+injected per request. Chat pages also pull an avatar, image previews and a web font, like
+the real one does, so the lean browser profile has something to save, and an attach menu
+whose uploads are counted in uploaded.
+
+    python mock_server.py --port 8765 --latency-ms 300 --invalid-rate 0.05
+
+then point a SessionManager at it with base_url="http://127.0.0.1:8765/".
+"""
+import argparse
+import json
+import random
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Outcomes of a mocked chat page
+OK = "ok"
+INVALID = "invalid"
+TIMEOUT = "timeout"
+QUEUED = "queued"
+
+SHELL_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>WhatsApp (mock)</title>
+<style>@font-face { font-family: "Mock Sans"; src: url("/assets/font.woff2"); } body { font-family: "Mock Sans"; }</style>
+</head>
+<body>
+<div id="side"><div role="textbox" contenteditable="true" data-tab="3"></div></div>
+<div id="app"></div>
+<script>const CHAT = %s;</script>
+<script>%s</script>
+</body></html>
+"""
+
+CHAT_JS = """
+function renderChat() {
+    if (!CHAT) return;
+    const app = document.getElementById('app');
+    if (CHAT.outcome === 'invalid') {
+        app.innerHTML = '<div data-animate-modal-popup="true"><div>Phone number shared via url is invalid.</div>' +
+            '<div><button>OK</button></div></div>';
+        return;
+    }
+    if (CHAT.outcome === 'timeout') return;
+    app.innerHTML = '<div id="main"><header><img class="avatar"><span dir="auto"></span></header><div id="messages"></div>' +
+        '<footer><span data-icon="plus"></span><div role="textbox" contenteditable="true" data-tab="10"></div>' +
+        '<span data-icon="send"></span></footer></div>';
+    document.querySelector('#main header img').src = '/assets/avatar-' + CHAT.phone + '.jpg';
+    for (let i = 0; i < CHAT.previews; i++) {
+        const preview = document.createElement('img');
+        preview.src = '/assets/preview-' + CHAT.phone + '-' + i + '.jpg';
+        document.getElementById('messages').appendChild(preview);
+    }
+    document.querySelector('#main header span').textContent = '+' + CHAT.phone;
+    document.querySelector('#main footer [contenteditable]').textContent = CHAT.text;
+    document.querySelector('#main footer span[data-icon="send"]').addEventListener('click', send);
+    document.querySelector('#main footer span[data-icon="plus"]').addEventListener('click', openAttachMenu);
+}
+
+function openAttachMenu() {
+    for (const accept of ['image/*,video/mp4,video/3gpp,video/quicktime', '*']) {
+        const input = document.createElement('input');
+        input.type = 'file';
+        input.accept = accept;
+        input.style.display = 'none';
+        input.addEventListener('change', () => showPreview(input.files[0]));
+        document.body.appendChild(input);
+    }
+}
+
+function showPreview(file) {
+    const preview = document.createElement('div');
+    preview.id = 'preview';
+    preview.innerHTML = '<div role="textbox" contenteditable="true"></div><span data-icon="send"></span>';
+    preview.querySelector('[data-icon="send"]').addEventListener('click', () => {
+        const caption = preview.querySelector('[contenteditable]').textContent;
+        preview.remove();
+        document.querySelectorAll('input[type="file"]').forEach(input => input.remove());
+        const message = outgoing(file.name + (caption ? ': ' + caption : ''));
+        // The tick only shows once the file is uploaded, like WhatsApp's clock icon
+        fetch('/upload?phone=' + encodeURIComponent(CHAT.phone), {method: 'POST', body: file})
+            .then(() => tick(message));
+    });
+    document.body.appendChild(preview);
+}
+
+function outgoing(text) {
+    const message = document.createElement('div');
+    message.className = 'message-out';
+    message.innerHTML = '<span data-icon="msg-time"></span><span class="text"></span>';
+    message.querySelector('.text').textContent = text;
+    document.getElementById('messages').appendChild(message);
+    return message;
+}
+
+function tick(message) {
+    if (CHAT.outcome !== 'queued') {
+        setTimeout(() => message.querySelector('[data-icon]').setAttribute('data-icon', 'msg-check'), CHAT.tick_ms);
+    }
+}
+
+function send() {
+    const compose = document.querySelector('#main footer [contenteditable]');
+    const message = outgoing(compose.textContent);
+    compose.textContent = '';
+    fetch('/ack?phone=' + encodeURIComponent(CHAT.phone));
+    tick(message);
+}
+
+// Like WhatsApp, a /send link shows a "Starting chat" popup until the chat (or the invalid-number dialog) is up
+if (CHAT) {
+    document.getElementById('app').innerHTML =
+        '<div data-animate-modal-popup="true"><div>Starting chat</div><div role="progressbar"></div></div>';
+}
+setTimeout(renderChat, CHAT ? CHAT.latency_ms : 0);
+"""
+
+
+class MockWhatsAppServer:
+    """Threaded HTTP server mocking WhatsApp Web; counts pages, assets served and messages "sent"."""
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0, tick_ms=50, invalid_rate=0.0,
+                 timeout_rate=0.0, queued_rate=0.0, seed=None, previews=3, asset_kb=64):
+        self.latency_ms = latency_ms
+        self.tick_ms = tick_ms
+        self.invalid_rate = invalid_rate
+        self.timeout_rate = timeout_rate
+        self.queued_rate = queued_rate
+        self.random = random.Random(seed)
+        self.previews = previews
+        self.asset = bytes(asset_kb * 1024)  # Body of every image and font, only its size matters
+        self.pages = 0
+        self.messages = 0
+        self.assets = 0
+        self.uploaded = 0  # bytes of attachments received
+        self._lock = threading.Lock()
+        self._thread = None
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def outcome(self):
+        with self._lock:
+            roll = self.random.random()
+        for outcome, rate in ((TIMEOUT, self.timeout_rate), (INVALID, self.invalid_rate), (QUEUED, self.queued_rate)):
+            if roll < rate:
+                return outcome
+            roll -= rate
+        return OK
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == "/ack":
+                    with server._lock:
+                        server.messages += 1
+                    self.send_response(204)
+                    self.end_headers()
+                    return
+                if url.path.startswith("/assets/"):
+                    with server._lock:
+                        server.assets += 1
+                    kind = "font/woff2" if url.path.endswith(".woff2") else "image/jpeg"
+                    self.send_response(200)
+                    self.send_header("Content-Type", kind)
+                    self.send_header("Content-Length", str(len(server.asset)))
+                    self.end_headers()
+                    self.wfile.write(server.asset)
+                    return
+                if url.path not in ("/", "/send"):
+                    self.send_error(404)
+                    return
+                chat = None
+                if url.path == "/send":
+                    chat = {"phone": query.get("phone", [""])[0], "text": query.get("text", [""])[0],
+                            "outcome": server.outcome(), "latency_ms": server.latency_ms, "tick_ms": server.tick_ms,
+                            "previews": server.previews}
+                with server._lock:
+                    server.pages += 1
+                body = (SHELL_HTML % (json.dumps(chat).replace("</", "<\\/"), CHAT_JS)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                if urlparse(self.path).path != "/upload":
+                    self.send_error(404)
+                    return
+                received = len(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+                with server._lock:
+                    server.messages += 1
+                    server.uploaded += received
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                pass  # keep benchmark output clean
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-whatsapp", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a mock WhatsApp Web for offline sending tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=int, default=0, help="Delay before the chat page is ready")
+    parser.add_argument("--tick-ms", type=int, default=50, help="Delay between the send click and the tick")
+    parser.add_argument("--invalid-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--queued-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--previews", type=int, default=3, help="Image previews on every chat page")
+    parser.add_argument("--asset-kb", type=int, default=64, help="Size of every image and font served")
+    args = parser.parse_args(argv)
+    server = MockWhatsAppServer(args.host, args.port, args.latency_ms, args.tick_ms, args.invalid_rate,
+                                args.timeout_rate, args.queued_rate, args.seed, args.previews, args.asset_kb)
+    print(f"Mock WhatsApp Web on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
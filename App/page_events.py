@@ -0,0 +1,118 @@
+from selenium.common.exceptions import TimeoutException
+
+# Events reported by the page
+CHAT_READY = "chat_ready"
+CHAT_OPEN = "chat_open"  # compose box shown, without text in it to send
+INVALID_NUMBER = "invalid_number"
+MESSAGE_QUEUED = "message_queued"
+MESSAGE_SENT = "message_sent"
+
+# Computes which events currently hold, then waits on a MutationObserver until one of the wanted
+# events shows up (or the timeout passes) and hands it back through Selenium's async callback.
+WAIT_FOR_EVENT_JS = """
+const wanted = arguments[0];
+const timeoutMs = arguments[1];
+const done = arguments[arguments.length - 1];
+
+function state() {
+    const events = [];
+    const compose = document.querySelector('#main footer [contenteditable="true"]');
+    // A /send link first shows a "Starting chat" popup in the same modal container; only the
+    // invalid-number dialog has an OK button and no progress indicator
+    const popup = document.querySelector('[data-animate-modal-popup="true"]');
+    if (popup && !compose && popup.querySelector('button, [role="button"]')
+            && !popup.querySelector('[role="progressbar"], progress')) {
+        events.push('invalid_number');
+    }
+    if (compose) {
+        events.push('chat_open');
+    }
+    if (compose && document.querySelector('#main span[data-icon="send"]')) {
+        events.push('chat_ready');
+    }
+    const outgoing = document.querySelectorAll('#main div.message-out');
+    const last = outgoing.length ? outgoing[outgoing.length - 1] : null;
+    if (last && !last.hasAttribute('data-wa-seen')) {
+        if (last.querySelector('[data-icon="msg-time"]')) {
+            events.push('message_queued');
+        }
+        if (last.querySelector('[data-icon="msg-check"], [data-icon="msg-dblcheck"], [data-icon="msg-dblcheck-ack"]')) {
+            events.push('message_sent');
+        }
+    }
+    return events;
+}
+
+function match() {
+    const current = state();
+    return wanted.find(event => current.includes(event));
+}
+
+const first = match();
+if (first) {
+    done(first);
+} else {
+    let finished = false;
+    const observer = new MutationObserver(() => {
+        const event = match();
+        if (event) finish(event);
+    });
+    const timer = setTimeout(() => finish('timeout'), timeoutMs);
+    function finish(event) {
+        if (finished) return;
+        finished = true;
+        observer.disconnect();
+        clearTimeout(timer);
+        done(event);
+    }
+    observer.observe(document, {childList: true, subtree: true, attributes: true, attributeFilter: ['data-icon']});
+}
+"""
+
+# Tags the outgoing messages already in the chat so only a new one can trigger the tick events
+MARK_OUTGOING_JS = """
+document.querySelectorAll('#main div.message-out').forEach(el => el.setAttribute('data-wa-seen', '1'));
+"""
+
+
+class InvalidNumberError(Exception):
+    """WhatsApp reported that the number is not on WhatsApp."""
+
+
+class PageEvents:
+    """Waits for WhatsApp Web page events pushed by a MutationObserver, instead of polling XPaths.
+
+    Each wait is one async script call that returns the moment the DOM change happens, so an
+    invalid-number popup fails in milliseconds and a message only counts once its tick shows.
+    """
+
+    def __init__(self, driver, script_timeout=120):
+        self.driver = driver
+        self.script_timeout = script_timeout
+        driver.set_script_timeout(script_timeout)
+
+    def wait_for(self, events, timeout):
+        """Return the first of events to occur, or raise TimeoutException after timeout seconds."""
+        timeout = min(timeout, self.script_timeout - 1)
+        event = self.driver.execute_async_script(WAIT_FOR_EVENT_JS, list(events), int(timeout * 1000))
+        if event == "timeout":
+            raise TimeoutException(f"None of {', '.join(events)} within {timeout}s")
+        return event
+
+    def wait_chat_ready(self, number, timeout, with_text=True):
+        """Wait for the chat with its text ready to send; with_text=False only waits for the chat to open."""
+        if self.wait_for((CHAT_READY if with_text else CHAT_OPEN, INVALID_NUMBER), timeout) == INVALID_NUMBER:
+            raise InvalidNumberError(f"{number} is not a valid WhatsApp number")
+
+    def mark_outgoing(self):
+        self.driver.execute_script(MARK_OUTGOING_JS)
+
+    def wait_delivery(self, timeout):
+        """Return "sent" once the new message is ticked, or "queued" if it is still on the clock icon."""
+        try:
+            self.wait_for((MESSAGE_SENT,), timeout)
+            return "sent"
+        except TimeoutException:
+            if self.wait_for((MESSAGE_SENT, MESSAGE_QUEUED), 0.1) == MESSAGE_SENT:
+                return "sent"
+            return "queued"
@@ -0,0 +1,133 @@
+import os
+import time
+from decimal import Decimal, InvalidOperation
+
+from app_paths import data_dir
+
+# E.164 allows at most 15 digits including the country code
+MIN_LENGTH = 8
+MAX_LENGTH = 15
+# Digits after the country code, (shortest, longest), for the countries whose plan is fixed enough
+# to check; numbers of other countries are only held to the E.164 lengths above
+NATIONAL_LENGTHS = {
+    "1": (10, 10), "7": (10, 10), "20": (9, 10), "33": (9, 9), "34": (9, 9), "44": (9, 10), "52": (10, 10),
+    "55": (10, 11), "61": (9, 9), "90": (10, 10), "91": (10, 10), "92": (9, 10), "212": (9, 9), "213": (8, 9),
+    "216": (8, 8), "962": (8, 9), "963": (8, 9), "964": (8, 10), "965": (8, 8), "966": (8, 9), "968": (8, 8),
+    "971": (8, 9), "973": (8, 8), "974": (8, 8),
+}
+
+# Rejection reasons, in the order they are checked
+EMPTY = "empty"
+NOT_A_NUMBER = "not a number"
+TOO_SHORT = "too short"
+TOO_LONG = "too long"
+BAD_PREFIX = "bad prefix"
+DUPLICATE = "duplicate"
+
+
+def _expand_scientific(value):
+    try:
+        return format(Decimal(value), "f").split(".")[0]
+    except InvalidOperation:
+        return value
+
+
+def normalize_numbers(numbers, country_code="", min_length=MIN_LENGTH, max_length=MAX_LENGTH,
+                      drop_duplicates=True, seen=None):
+    """Normalize a column of phone numbers to international digits and validate them.
+
+    Works on the whole column at once and returns a DataFrame with the same index and two
+    columns: ``number`` (digits only, country code included) and ``reason`` ("" for valid
+    numbers, otherwise why the row is rejected). Handles Excel float artifacts such as
+    ``9665xxxxxxx.0`` and ``9.665E+11``, ``+``/``00`` prefixes, and, when ``country_code``
+    is given, local numbers written with a leading 0 or without any country code: every number
+    that is neither international nor already starting with the code gets it, and numbers of
+    that country are checked against its NATIONAL_LENGTHS when it has one.
+    ``seen`` is a set of numbers accepted from earlier chunks of the same sheet; they count as
+    duplicates here, and this chunk's valid numbers are added to it.
+    """
+    import pandas as pd
+
+    text = pd.Series(numbers, dtype=object).fillna("").astype(str).str.strip()
+    reason = pd.Series("", index=text.index, dtype=object)
+    reason[text == ""] = EMPTY
+
+    # Excel stores numbers as floats: "966501234567.0" and "9.66501234567E+11"
+    text = text.str.replace(r"^(\d+)\.0*$", r"\1", regex=True)
+    scientific = text.str.fullmatch(r"\d+(?:\.\d+)?[eE]\+?\d+")
+    if scientific.any():
+        text[scientific] = text[scientific].map(_expand_scientific)
+
+    # Anything besides digits, spaces, dashes, dots, slashes and brackets is not a phone number
+    bad_chars = text.str.contains(r"[^\d\s\-+().\/]", regex=True) & (reason == "")
+    reason[bad_chars] = NOT_A_NUMBER
+
+    international = text.str.startswith("+")
+    digits = text.str.replace(r"\D+", "", regex=True)
+    double_zero = ~international & digits.str.startswith("00")
+    digits[double_zero] = digits[double_zero].str[2:]
+    international |= double_zero
+
+    if country_code:
+        country_code = "".join(ch for ch in str(country_code) if ch.isdigit())
+        local = ~international & ~digits.str.startswith(country_code) & (digits != "")
+        digits[local] = country_code + digits[local].str.lstrip("0")
+
+    length = digits.str.len()
+    pending = reason == ""
+    reason[pending & (digits == "")] = NOT_A_NUMBER
+    pending = reason == ""
+    reason[pending & (length < min_length)] = TOO_SHORT
+    reason[pending & (length > max_length)] = TOO_LONG
+    if country_code in NATIONAL_LENGTHS:
+        shortest, longest = NATIONAL_LENGTHS[country_code]
+        national = length - len(country_code)
+        domestic = (reason == "") & digits.str.startswith(country_code)
+        reason[domestic & (national < shortest)] = TOO_SHORT
+        reason[domestic & (national > longest)] = TOO_LONG
+    pending = reason == ""
+    reason[pending & digits.str.startswith("0")] = BAD_PREFIX
+
+    if drop_duplicates:
+        pending = reason == ""
+        first_seen = digits.where(pending)  # rejected rows become NaN and are masked out below
+        duplicate = first_seen.duplicated(keep="first")
+        if seen:
+            duplicate |= digits.isin(seen)
+        reason[pending & duplicate] = DUPLICATE
+        if seen is not None:
+            seen.update(digits[reason == ""])
+
+    return pd.DataFrame({"number": digits, "reason": reason}, index=text.index)
+
+
+def summarize(result):
+    """Return (valid_count, {reason: count}) for a normalize_numbers result."""
+    counts = result["reason"].value_counts()
+    valid = int(counts.get("", 0))
+    return valid, {reason: int(count) for reason, count in counts.items() if reason}
+
+
+def default_report_dir():
+    return data_dir("reports")
+
+
+def write_rejected_report(df, result, source_path, report_dir=None, path=None):
+    """Save the rejected rows with their reason to a CSV report and return its path.
+
+    Pass the path returned for an earlier chunk of the same sheet to append to that report.
+    """
+    rejected = result["reason"] != ""
+    if not rejected.any():
+        return path
+    report = df[rejected].copy()
+    report.insert(0, "Rejected Reason", result.loc[rejected, "reason"])
+    if path:
+        report.to_csv(path, mode="a", header=False, index_label="Row", encoding="utf-8")
+        return path
+    report_dir = report_dir or default_report_dir()
+    os.makedirs(report_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    path = os.path.join(report_dir, f"{name}-rejected-{time.strftime('%Y%m%d-%H%M%S')}.csv")
+    report.to_csv(path, index_label="Row", encoding="utf-8-sig")
+    return path
@@ -0,0 +1,56 @@
+import os
+
+
+def rss_bytes(pid=None):
+    """Resident memory of a process (this one by default), or None if it cannot be read."""
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def child_pids(pid):
+    """Every descendant of pid (Chrome's browser, GPU and renderer processes under chromedriver)."""
+    try:
+        import psutil
+        return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+    except ImportError:
+        pass
+    except Exception:
+        return []
+    children = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name is in parentheses and may contain spaces, the ppid follows it
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    found, pending = [], [pid]
+    while pending:
+        for child in children.get(pending.pop(), []):
+            found.append(child)
+            pending.append(child)
+    return found
+
+
+def tree_rss(pid):
+    """Summed resident memory of pid and all its descendants, or None if it cannot be read."""
+    sizes = [rss_bytes(p) for p in [pid, *child_pids(pid)]]
+    sizes = [size for size in sizes if size is not None]
+    return sum(sizes) if sizes else None
@@ -0,0 +1,78 @@
+import itertools
+import time
+from collections import deque, namedtuple
+
+# Final outcomes of a contact
+SENT = "sent"
+FAILED = "failed"
+
+ProgressSnapshot = namedtuple("ProgressSnapshot", [
+    "total", "sent", "failed", "pending", "per_minute", "eta", "events", "statuses", "dropped"])
+
+
+class ProgressChannel:
+    """Carries progress from the sending threads to the GUI without a signal per contact.
+
+    Producers only append to deques (atomic in CPython, so no locks on the send path) and the
+    GUI pulls a ProgressSnapshot on its own timer. snapshot() must only be called from one
+    thread; it folds the new outcomes into the counters and drains the buffered events.
+    """
+
+    def __init__(self, total=0, max_events=10000, window=60.0, clock=time.monotonic):
+        self.total = total
+        self.window = window  # seconds of history used for the throughput and the ETA
+        self.clock = clock
+        self._outcomes = deque()  # (kind, time), drained by every snapshot
+        self._events = deque(maxlen=max_events)  # (sequence number, message, status_type)
+        self._statuses = deque()  # (sheet rows, status)
+        self._sequence = itertools.count()
+        self._last_sequence = -1
+        self.sent = 0
+        self.failed = 0
+        self._recent = deque()  # completion times inside the window
+
+    def set_total(self, total):
+        self.total = total
+
+    def post(self, message, status_type="info"):
+        self._events.append((next(self._sequence), message, status_type))
+
+    def row_status(self, rows, status):
+        self._statuses.append((rows, status))
+
+    def outcome(self, kind):
+        self._outcomes.append((kind, self.clock()))
+
+    def _drain(self, source):
+        items = []
+        while True:
+            try:
+                items.append(source.popleft())
+            except IndexError:
+                return items
+
+    def snapshot(self):
+        for kind, at in self._drain(self._outcomes):
+            if kind == SENT:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self._recent.append(at)
+        now = self.clock()
+        while self._recent and now - self._recent[0] > self.window:
+            self._recent.popleft()
+
+        # Events beyond max_events were pushed out of the deque before this snapshot
+        events = self._drain(self._events)
+        dropped = 0
+        if events:
+            last = max(event[0] for event in events)
+            dropped = max(last - self._last_sequence - len(events), 0)
+            self._last_sequence = last
+
+        pending = max(self.total - self.sent - self.failed, 0)
+        elapsed = min(self.window, now - self._recent[0]) if len(self._recent) > 1 else 0
+        per_minute = (len(self._recent) - 1) / elapsed * 60 if elapsed else 0.0
+        eta = pending / per_minute * 60 if per_minute and pending else None
+        return ProgressSnapshot(self.total, self.sent, self.failed, pending, per_minute, eta,
+                                [event[1:] for event in events], self._drain(self._statuses), dropped)
@@ -0,0 +1,83 @@
+import random
+import threading
+import time
+from collections import deque
+
+
+class RateLimiter:
+    """Paces the messages of one WhatsApp account.
+
+    - min_interval: target seconds between the start of two sends. The time the send itself
+      took is subtracted, so a 12 s page load followed by a 10 s delay does not wait 22 s.
+    - per_minute / per_hour: sliding-window caps on the number of sends.
+    - jitter: random +/- fraction applied to every interval so sends do not look scripted.
+    - Adaptive backoff: failures and slow sends stretch the interval (up to max_backoff
+      times), successful fast sends shrink it back. With backoff_kinds, only failures of those
+      kinds back off; others (an invalid number, say) leave the pace as it is.
+    """
+
+    def __init__(self, min_interval=10, per_minute=None, per_hour=None, jitter=0.2,
+                 slow_send=10.0, max_backoff=8.0, clock=time.monotonic, backoff_kinds=None):
+        self.min_interval = float(min_interval)
+        self.per_minute = per_minute
+        self.per_hour = per_hour
+        self.jitter = jitter
+        self.slow_send = slow_send
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.backoff_kinds = backoff_kinds
+        self.backoff = 1.0
+        self.last_start = None
+        self.history = deque()  # start times of the sends in the last hour
+        self._lock = threading.Lock()
+
+    def _window_delay(self, now):
+        while self.history and now - self.history[0] >= 3600:
+            self.history.popleft()
+        delay = 0.0
+        if self.per_hour and len(self.history) >= self.per_hour:
+            delay = max(delay, self.history[-self.per_hour] + 3600 - now)
+        if self.per_minute:
+            recent = [t for t in self.history if now - t < 60]
+            if len(recent) >= self.per_minute:
+                delay = max(delay, recent[-self.per_minute] + 60 - now)
+        return delay
+
+    def next_delay(self):
+        """Seconds to wait before the next send is allowed."""
+        with self._lock:
+            now = self.clock()
+            delay = self._window_delay(now)
+            if self.last_start is not None:
+                interval = self.min_interval * self.backoff
+                if self.jitter:
+                    interval *= 1 + random.uniform(-self.jitter, self.jitter)
+                delay = max(delay, self.last_start + interval - now)
+            return max(delay, 0.0)
+
+    def wait(self, stopped=None):
+        """Block until the next send is allowed; returns False if stopped (a threading.Event) was set."""
+        delay = self.next_delay()
+        if delay > 0:
+            if stopped is not None:
+                if stopped.wait(delay):
+                    return False
+            else:
+                time.sleep(delay)
+        with self._lock:
+            self.last_start = self.clock()
+            self.history.append(self.last_start)
+        return True
+
+    def record(self, ok, duration, kind=None):
+        """Feed back the outcome of a send so the pace adapts to throttling; kind is the failure's kind."""
+        with self._lock:
+            if not ok and self.backoff_kinds is not None and kind not in self.backoff_kinds:
+                return self.backoff
+            if not ok:
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+            elif self.slow_send and duration > self.slow_send:
+                self.backoff = min(self.backoff * 1.5, self.max_backoff)
+            else:
+                self.backoff = max(1.0, self.backoff * 0.8)
+            return self.backoff
@@ -0,0 +1,144 @@
+import heapq
+import os
+import threading
+import time
+
+from selenium.common.exceptions import (TimeoutException, StaleElementReferenceException,
+                                        NoSuchElementException, ElementClickInterceptedException,
+                                        InvalidSessionIdException, WebDriverException)
+
+from app_paths import data_dir
+from page_events import InvalidNumberError
+from whatsapp_web import DeliveryUnknownError
+
+# Failure kinds
+TIMEOUT = "timeout"
+STALE_ELEMENT = "stale element"
+DRIVER_CRASH = "driver crash"
+INVALID_NUMBER = "invalid number"
+DELIVERY_UNKNOWN = "delivery unknown"  # failed after the send click, the message may have gone out
+NO_SESSION = "no session"
+OTHER = "other"
+
+# Kinds that happened before anything was sent and are worth another attempt
+TRANSIENT = (TIMEOUT, STALE_ELEMENT, DRIVER_CRASH)
+# Kinds that can mean WhatsApp or the browser is struggling, so the account slows down after them
+THROTTLING = (TIMEOUT, DRIVER_CRASH, DELIVERY_UNKNOWN)
+
+
+def classify(error, session_alive=True):
+    """Return the failure kind of a send error."""
+    if isinstance(error, InvalidNumberError):
+        return INVALID_NUMBER
+    if isinstance(error, DeliveryUnknownError):
+        return DELIVERY_UNKNOWN
+    if not session_alive or isinstance(error, InvalidSessionIdException):
+        return DRIVER_CRASH
+    if isinstance(error, TimeoutException):
+        return TIMEOUT
+    if isinstance(error, (StaleElementReferenceException, NoSuchElementException,
+                          ElementClickInterceptedException)):
+        return STALE_ELEMENT
+    if isinstance(error, WebDriverException):
+        return DRIVER_CRASH
+    return OTHER
+
+
+class RetryPolicy:
+    """Exponential backoff for transient failures: base_delay, then x factor per attempt, capped."""
+
+    def __init__(self, max_attempts=3, base_delay=30.0, factor=2.0, max_delay=600.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.factor = factor
+        self.max_delay = max_delay
+
+    def delay(self, kind, attempt):
+        """Seconds before retrying after failed attempt number attempt (1-based), or None to give up."""
+        if kind not in TRANSIENT or attempt >= self.max_attempts:
+            return None
+        return min(self.base_delay * self.factor ** (attempt - 1), self.max_delay)
+
+
+class RetryQueue:
+    """Failed jobs waiting for their backoff to pass, ordered by due time."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._heap = []
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._heap)
+
+    def push(self, job, delay):
+        with self._lock:
+            self._seq += 1
+            heapq.heappush(self._heap, (self.clock() + delay, self._seq, job))
+
+    def pop_due(self):
+        """Return the next job whose backoff has passed, or None."""
+        with self._lock:
+            if self._heap and self._heap[0][0] <= self.clock():
+                return heapq.heappop(self._heap)[2]
+            return None
+
+    def next_due_in(self):
+        """Seconds until the next job is due, or None if the queue is empty."""
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(self._heap[0][0] - self.clock(), 0.0)
+
+    def drain(self):
+        with self._lock:
+            jobs = [item[2] for item in sorted(self._heap)]
+            self._heap = []
+        return jobs
+
+
+def default_dead_letter_dir():
+    return data_dir("reports")
+
+
+class DeadLetter:
+    """Collects the contacts that finally failed and writes them to a file that can be sent again.
+
+    The file keeps the source's columns (so it loads like any contacts sheet) with the failure
+    kind, error and attempt count appended. It is an .xlsx for Excel sources and a .csv otherwise.
+    """
+
+    def __init__(self, source_path, columns, report_dir=None):
+        self.source_path = source_path
+        self.columns = list(columns)
+        self.report_dir = report_dir or default_dead_letter_dir()
+        self.rows = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, contact, kind, error, attempts):
+        with self._lock:
+            self.rows.append((*contact.values, kind, str(error), attempts))
+
+    def write(self):
+        """Write the collected rows and return the file's path, or None if nothing failed."""
+        import pandas as pd
+
+        with self._lock:
+            if not self.rows:
+                return None
+            rows = list(self.rows)
+        os.makedirs(self.report_dir, exist_ok=True)
+        name, ext = os.path.splitext(os.path.basename(self.source_path))
+        ext = ".xlsx" if ext.lower() in (".xlsx", ".xlsm", ".xls") else ".csv"
+        path = os.path.join(self.report_dir, f"{name}-failed-{time.strftime('%Y%m%d-%H%M%S')}{ext}")
+        report = pd.DataFrame(rows, columns=[*self.columns, "Failure", "Error", "Attempts"])
+        if ext == ".xlsx":
+            report.to_excel(path, index=False)
+        else:
+            report.to_csv(path, index=False, encoding="utf-8-sig")
+        return path
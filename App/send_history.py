@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import threading
+import time
+
+from app_paths import data_dir
+
+# Why a contact was suppressed
+OPTED_OUT = "opted out"
+RECENTLY_MESSAGED = "recently messaged"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sends (
+    number INTEGER NOT NULL,
+    sent_at REAL NOT NULL,
+    campaign TEXT
+);
+CREATE INDEX IF NOT EXISTS sends_sent_at ON sends (sent_at, number);
+CREATE TABLE IF NOT EXISTS suppressions (
+    number INTEGER PRIMARY KEY,
+    reason TEXT,
+    added_at REAL NOT NULL
+);
+"""
+
+
+def default_history_path():
+    return data_dir("history.db")
+
+
+class SendHistory:
+    """Every number ever messaged, plus the opt-out list, shared by all campaigns.
+
+    Numbers are stored as integers (normalized numbers are at most 15 digits). check() loads
+    the relevant numbers once into a sorted numpy array and tests a whole sheet column
+    against it in one vectorized pass, so millions of past sends cost seconds, not minutes.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_history_path()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._suppressed = None  # cached sorted array of opted-out numbers
+        self._recent = None  # (campaign, within_days, sorted array of numbers sent since then)
+
+    def _fetch_array(self, sql, params=()):
+        import numpy as np
+
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            values = np.fromiter((r[0] for r in cursor), dtype=np.int64)
+        return np.unique(values)
+
+    def record_send(self, number, campaign=None):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO sends (number, sent_at, campaign) VALUES (?, ?, ?)",
+                               (int(number), time.time(), campaign))
+
+    def add_suppressions(self, numbers, reason=OPTED_OUT):
+        """Add numbers (normalized digits) to the opt-out list; returns how many were new."""
+        rows = [(int(n), reason, time.time()) for n in numbers if str(n).isdigit()]
+        with self._lock, self._conn:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO suppressions (number, reason, added_at) VALUES (?, ?, ?)", rows)
+            added = self._conn.total_changes - before
+        self._suppressed = None
+        return added
+
+    def suppressed_count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM suppressions").fetchone()[0]
+
+    def check(self, numbers, within_days=None, campaign=None):
+        """Return a Series aligned with numbers: OPTED_OUT, RECENTLY_MESSAGED or "" for each number.
+
+        numbers are normalized digit strings. RECENTLY_MESSAGED is only checked when
+        within_days is set. Pass the campaign (any object, compared by identity) to check a sheet
+        a chunk at a time: the recent sends are then loaded once for it, not on every call.
+        """
+        import numpy as np
+        import pandas as pd
+
+        numbers = pd.Series(numbers)
+        values = pd.to_numeric(numbers, errors="coerce").fillna(-1).astype(np.int64).to_numpy()
+        reasons = np.full(len(values), "", dtype=object)
+
+        if self._suppressed is None:
+            self._suppressed = self._fetch_array("SELECT number FROM suppressions")
+        reasons[np.isin(values, self._suppressed, assume_unique=False)] = OPTED_OUT
+
+        if within_days:
+            cached = self._recent
+            if campaign is not None and cached is not None and cached[0] is campaign and cached[1] == within_days:
+                recent = cached[2]
+            else:
+                since = time.time() - within_days * 86400
+                recent = self._fetch_array("SELECT number FROM sends WHERE sent_at >= ?", (since,))
+                if campaign is not None:
+                    self._recent = (campaign, within_days, recent)
+            reasons[(reasons == "") & np.isin(values, recent)] = RECENTLY_MESSAGED
+        return pd.Series(reasons, index=numbers.index, dtype=object)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
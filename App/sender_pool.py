@@ -0,0 +1,397 @@
+import queue
+import threading
+import time
+from collections import deque
+from statistics import median
+
+from transport import browser_transport, SELENIUM
+from rate_limiter import RateLimiter
+from browser_watchdog import BrowserWatchdog
+from metrics import timed, SESSION_START, BROWSER_RECYCLE, RATE_WAIT, SEND
+from retry_queue import RetryPolicy, RetryQueue, classify, NO_SESSION, THROTTLING
+
+# Sentinel telling a worker there are no more contacts
+_DONE = object()
+
+
+class SendResult:
+    __slots__ = ("contact", "worker", "ok", "error", "state", "kind", "attempt", "retry_in", "duration")
+
+    def __init__(self, contact, worker, ok, error=None, state=None, kind=None, attempt=1, duration=None):
+        self.contact = contact
+        self.worker = worker
+        self.ok = ok
+        self.error = error
+        self.state = state  # "sent" (ticked) or "queued" (still on the clock icon) when ok
+        self.kind = kind  # failure kind from retry_queue.classify when not ok
+        self.attempt = attempt
+        self.retry_in = None  # seconds until the contact is tried again, None if this result is final
+        self.duration = duration  # seconds the send attempt took
+
+
+class SenderWorker(threading.Thread):
+    """One sending session (a Transport) sending messages taken from the pool's shared queue."""
+
+    def __init__(self, pool, worker_id, session):
+        super().__init__(name=f"sender-worker-{worker_id}", daemon=True)
+        self.pool = pool
+        self.worker_id = worker_id
+        self.transport = pool.transport_factory(session)
+        self.sent = 0
+        # Limits apply per account, so every worker paces itself
+        self.limiter = RateLimiter(pool.delay, pool.per_minute, pool.per_hour, backoff_kinds=THROTTLING)
+        self.watchdog = BrowserWatchdog(pool.recycle_policy, lambda message: self.status(message, "warning"))
+        # Chats prepared ahead of their send click, as many as the transport can hold open
+        limit = self.transport.max_prepared
+        self.depth = min(pool.prefetch, limit) if limit else pool.prefetch
+        self.prepared = deque()  # (job, PreparedChat, seconds preparing it)
+        self.prepare_times = deque(maxlen=20)
+
+    def status(self, message, status_type):
+        prefix = f"[Session {self.worker_id + 1}] " if self.pool.size > 1 else ""
+        self.pool.on_status(prefix + message, status_type)
+
+    def connect(self):
+        with timed(self.pool.metrics, SESSION_START):
+            self.transport.connect(self.status)
+
+    def send(self, number, message, attachment=None):
+        return self.transport.send(number, message, attachment)
+
+    def recycle(self, reason):
+        """Swap the browser for a fresh one; the queue position and rate limiter carry on as they were."""
+        self.status(f"Restarting the browser: {reason}", "info")
+        self.release_prepared()
+        with timed(self.pool.metrics, BROWSER_RECYCLE):
+            self.transport.recycle(self.status)
+        self.watchdog.restarted()
+        with self.pool._lock:
+            self.pool.recycled += 1
+
+    def release_prepared(self):
+        """Hand chats prepared on this browser back to the pool, for whichever worker is free next."""
+        with self.pool._lock:
+            while self.prepared:
+                job, _, _ = self.prepared.popleft()
+                self.pool.retries.push(job, 0)
+            self.pool._reported.notify()
+
+    def run(self):
+        try:
+            self.connect()
+        except Exception as e:
+            self.status(f"Browser session failed to start: {str(e)}", "error")
+            return
+        finished = self.run_pipelined() if self.depth else self.run_serial()
+        if finished:
+            self.report_usage()
+        else:
+            self.release_prepared()
+
+    def run_serial(self):
+        """Load, click and confirm one contact at a time. Returns False if the browser was lost."""
+        paced = 0.0  # seconds spent waiting for the rate limiter before the next send
+        while not self.pool.stopped.is_set():
+            # Wait out the pacing before taking a job, so idle workers can pick it up meanwhile
+            delay = self.limiter.next_delay()
+            if delay > 0:
+                if self.pool.stopped.wait(delay):
+                    break
+                paced += delay
+            try:
+                item = self.pool.queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                break
+            waited = time.monotonic()
+            if not self.limiter.wait(self.pool.stopped):
+                break
+            if self.pool.metrics is not None:
+                self.pool.metrics.observe(RATE_WAIT, paced + time.monotonic() - waited)
+            paced = 0.0
+            self.pool.on_start(item[0])
+            if not self.attempt(item, lambda: self.send(item[0].number, item[1], item[3])):
+                return False
+        return True
+
+    def run_pipelined(self):
+        """Prepare the next chats while the rate limiter holds back the send click.
+
+        The chat load overlaps the pacing delay, and the limiter paces the clicks themselves.
+        Returns False if the browser was lost.
+        """
+        paced = 0.0
+        finishing = False
+        while not self.pool.stopped.is_set():
+            # Top up the prepared chats, unless the first of them is already due to go out
+            take = not finishing and len(self.prepared) < self.depth
+            if take and self.prepared and self.limiter.next_delay() <= 0:
+                take = False
+            if take:
+                if not self.prepared:
+                    # Start preparing when it would be done about when the pacing lets the click go out
+                    delay = self.limiter.next_delay() - self.lead_time()
+                    if delay > 0:
+                        if self.pool.stopped.wait(delay):
+                            break
+                        paced += delay
+                try:
+                    item = self.pool.queue.get_nowait() if self.prepared else self.pool.queue.get(timeout=0.2)
+                except queue.Empty:
+                    item = None
+                if item is _DONE:
+                    finishing = True
+                elif item is not None:
+                    if not self.prepare(item):
+                        return False
+                    continue
+            if not self.prepared:
+                if finishing:
+                    break
+                continue
+            waited = time.monotonic()
+            if not self.limiter.wait(self.pool.stopped):
+                break
+            if self.pool.metrics is not None:
+                self.pool.metrics.observe(RATE_WAIT, paced + time.monotonic() - waited)
+            paced = 0.0
+            job, chat, preparing = self.prepared.popleft()
+            self.pool.on_start(job[0])
+            if not self.attempt(job, lambda: self.transport.send_prepared(chat), preparing):
+                return False
+        return True
+
+    def lead_time(self):
+        return median(self.prepare_times) if self.prepare_times else 0.0
+
+    def prepare(self, job):
+        """Get job's chat ready to send; a failure is reported like a failed send."""
+        contact, message, attempt, attachment = job
+        started = time.monotonic()
+        try:
+            chat = self.transport.prepare(contact.number, message, attachment)
+        except Exception as e:
+            return self.settle(job, False, e, None, time.monotonic() - started)
+        preparing = time.monotonic() - started
+        self.prepare_times.append(preparing)
+        self.prepared.append((job, chat, preparing))
+        return True
+
+    def attempt(self, job, send, preparing=0.0):
+        """Run send() for job; preparing is the time its chat took to load beforehand."""
+        started = time.monotonic()
+        try:
+            state = send()
+            ok, error = True, None
+            self.sent += 1
+        except Exception as e:
+            ok, error, state = False, e, None
+        return self.settle(job, ok, error, state, preparing + time.monotonic() - started)
+
+    def settle(self, job, ok, error, state, duration):
+        """Report a send's outcome and keep the browser healthy; returns False if it was lost."""
+        contact, message, attempt, attachment = job
+        alive = ok or self.transport.is_alive()
+        kind = None if ok else classify(error, alive)
+        if self.pool.metrics is not None:
+            self.pool.metrics.observe(SEND, duration)
+        self.pool.report(SendResult(contact, self.worker_id, ok, error, state, kind, attempt, duration),
+                         message, attachment)
+        self.adapt(ok, duration, kind)
+        if not alive:
+            self.release_prepared()
+            try:
+                self.connect()  # Browser crashed, reconnect for the next contact
+            except Exception as e:
+                self.status(f"Browser session lost: {str(e)}", "error")
+                return False
+            self.watchdog.restarted()
+            return True
+        # Between two contacts is a safe point to swap a leaking or slowed-down browser
+        self.watchdog.record(ok, duration)
+        reason = self.watchdog.check(self.transport)
+        if reason and not self.pool.stopped.is_set():
+            try:
+                self.recycle(reason)
+            except Exception as e:
+                self.status(f"Browser restart failed: {str(e)}", "error")
+                return False
+        return True
+
+    def report_usage(self):
+        usage = self.transport.usage()
+        if usage is None:
+            return
+        memory = f"{usage.rss / 2 ** 20:.0f} MB" if usage.rss else "unknown"
+        self.status(f"Browser memory {memory}, last page loaded {usage.requests} resources "
+                    f"({usage.transferred / 1024:.0f} KB)", "info")
+
+    def adapt(self, ok, duration, kind=None):
+        previous = self.limiter.backoff
+        backoff = self.limiter.record(ok, duration, kind)
+        if backoff >= 2 and backoff > previous:
+            self.status(f"Sends are failing or slow, slowing down to {self.limiter.min_interval * backoff:.0f}s between messages", "warning")
+        elif previous >= 2 and backoff < 2:
+            self.status("Send rate back to normal", "info")
+
+
+class SenderPool:
+    """Sends a stream of (contact, message) or (contact, message, attachment) jobs through several
+    browser sessions in parallel.
+
+    Every session is a separate Chrome profile linked to its own WhatsApp account. Workers pull
+    from one bounded queue, so a slow or failed session never holds back the others, and
+    results from all workers are funnelled through on_result for a single progress stream.
+    Transient failures are put back with exponential backoff (see retry_queue) and fed in
+    between fresh contacts; on_result sees them with retry_in set. Each worker restarts its
+    browser when it leaks or slows down (see browser_watchdog). With prefetch, each worker loads
+    its next chats while the rate limiter holds back the current send click.
+    """
+
+    def __init__(self, sessions, delay, send_mode="navigate", on_result=None, on_status=None,
+                 per_minute=None, per_hour=None, on_start=None, retry_policy=None, transport_factory=None,
+                 metrics=None, recycle_policy=None, engine=SELENIUM, prefetch=0):
+        self.sessions = list(sessions)
+        self.size = len(self.sessions)
+        self.delay = delay
+        self.per_minute = per_minute
+        self.per_hour = per_hour
+        self.send_mode = send_mode
+        self.metrics = metrics  # metrics.Metrics timing session start, pacing and every send phase
+        # Builds each worker's Transport from its session; WhatsApp Web through the given engine by default
+        self.transport_factory = transport_factory or (
+            lambda session: browser_transport(session, send_mode, metrics, engine))
+        self.on_result = on_result or (lambda result: None)
+        self.on_status = on_status or (lambda message, status_type: None)
+        self.on_start = on_start or (lambda contact: None)  # Called right before a send is attempted
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.recycle_policy = recycle_policy  # browser_watchdog.RecyclePolicy, the default one if None
+        # Chats each worker prepares ahead of its send click, 0 to load, click and confirm one at a time
+        self.prefetch = prefetch
+        self.retries = RetryQueue()
+        self.queue = queue.Queue(maxsize=self.size * 2)
+        self.stopped = threading.Event()
+        self.workers = []
+        self._lock = threading.Lock()
+        self._reported = threading.Condition(self._lock)
+        self.completed = 0
+        self.succeeded = 0
+        self.unconfirmed = 0  # Sent but not ticked yet when the worker moved on
+        self.retried = 0
+        self.recycled = 0  # Browsers restarted by a worker's watchdog
+        self.outstanding = 0  # Jobs handed to the workers (or waiting for a retry) without a final result
+        self.sessions_lost = False  # Every session died before the jobs ran out (not a stop())
+        self.abandoned = 0  # Jobs reported as NO_SESSION once every session was lost
+
+    def report(self, result, message=None, attachment=None):
+        # on_result (journal, history and progress writes) runs outside the lock, so workers
+        # reporting at the same time only wait for each other on the counters
+        if not result.ok and message is not None and not self.stopped.is_set():
+            result.retry_in = self.retry_policy.delay(result.kind, result.attempt)
+            if result.retry_in is not None:
+                # Reported before it is queued, so no worker can pick it up again before it is marked pending
+                self.on_result(result)
+                with self._lock:
+                    self.retries.push((result.contact, message, result.attempt + 1, attachment), result.retry_in)
+                    self.retried += 1
+                return
+        with self._lock:
+            self.outstanding -= 1
+            self._reported.notify()
+            self.completed += 1
+            if result.ok:
+                self.succeeded += 1
+                if result.state == "queued":
+                    self.unconfirmed += 1
+        self.on_result(result)
+
+    def stop(self):
+        self.stopped.set()
+
+    def _alive(self):
+        return any(worker.is_alive() for worker in self.workers)
+
+    def _put(self, item):
+        # Block while the queue is full, but give up if stopped or every worker has died
+        while not self.stopped.is_set() and self._alive():
+            try:
+                self.queue.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self, jobs):
+        """Feed jobs to the workers and block until all of them are sent or the pool is stopped.
+
+        Returns False if the pool was stopped or every session failed before the jobs ran out. In
+        the latter case sessions_lost is set and the jobs queued or waiting for a retry are
+        reported as failed with NO_SESSION; contacts not taken from jobs yet get no result.
+        """
+        self.workers = [SenderWorker(self, i, session) for i, session in enumerate(self.sessions)]
+        for worker in self.workers:
+            worker.start()
+
+        finished = True
+        jobs = iter(jobs)
+        exhausted = False
+        unsent = None  # The job in hand when the last session died
+        while True:
+            # Retries whose backoff has passed go first, fresh contacts fill the gaps meanwhile
+            job = self.retries.pop_due()
+            if job is None and not exhausted:
+                fresh = next(jobs, None)
+                if fresh is None:
+                    exhausted = True
+                    continue
+                with self._lock:
+                    self.outstanding += 1
+                contact, message, *attachment = fresh
+                job = (contact, message, 1, attachment[0] if attachment else None)
+            if job is None:
+                # Only in-flight jobs and pending retries left: wake up on the next result or retry
+                with self._lock:
+                    if not self.outstanding:
+                        break
+                    self._reported.wait(min(self.retries.next_due_in() or 0.2, 0.2))
+                if self.stopped.is_set() or not self._alive():
+                    finished = False
+                    break
+                continue
+            if not self._put(job):
+                finished = False
+                unsent = job
+                break
+
+        if finished:
+            for _ in self.workers:
+                if not self._put(_DONE):
+                    break
+        else:
+            # Stopped by the user, or every session died; workers still running have to stop either way
+            self.sessions_lost = not self.stopped.is_set()
+            self.stopped.set()
+        for worker in self.workers:
+            worker.join()
+
+        if self.sessions_lost:
+            # Report the jobs every session left behind instead of losing them silently
+            completed = self.completed
+            if unsent is not None:
+                self.report(SendResult(unsent[0], None, False, RuntimeError("No browser session left to send"),
+                                       kind=NO_SESSION, attempt=unsent[2]))
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _DONE:
+                    self.report(SendResult(item[0], None, False, RuntimeError("No browser session left to send"),
+                                           kind=NO_SESSION, attempt=item[2]))
+            for item in self.retries.drain():
+                self.report(SendResult(item[0], None, False, RuntimeError("No browser session left to retry"),
+                                       kind=NO_SESSION, attempt=item[2] - 1))
+            self.abandoned = self.completed - completed
+            return False
+        return finished and not self.stopped.is_set()
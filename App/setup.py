@@ -112,7 +112,7 @@ def main():
     # 4. Install dependencies
     log_message(">> Installing dependencies...")
     run_command(python + "pip install --upgrade pip")
-    run_command(python + "pip install pyinstaller pandas selenium PyQt5 requests openpyxl")
+    run_command(python + "pip install pyinstaller pandas selenium PyQt5 requests openpyxl pyarrow websockets psutil")
 
     # 5. Create an executable using PyInstaller
     
@@ -0,0 +1,16 @@
+from browser_session import BrowserUsage
+from browser_watchdog import BrowserWatchdog, RecyclePolicy
+
+
+class UnmeasuredTransport:
+    def usage(self):
+        return BrowserUsage(None, 10, 1024)
+
+
+def test_unreadable_memory_is_reported_once():
+    warnings = []
+    watchdog = BrowserWatchdog(RecyclePolicy(check_every=1), warnings.append)
+    for _ in range(3):
+        watchdog.record(True, 1.0)
+        assert watchdog.check(UnmeasuredTransport()) is None
+    assert len(warnings) == 1
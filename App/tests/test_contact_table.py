@@ -0,0 +1,56 @@
+from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import QApplication
+
+import app
+
+qt_app = QApplication.instance() or QApplication([])
+
+
+def wait_for_queries(window):
+    model = window.contact_model
+    while model.queries:
+        QApplication.processEvents()
+        for query in list(model.queries):
+            query.wait(100)
+    QApplication.processEvents()
+
+
+def make_window(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path))
+    return app.MainWindow()
+
+
+def test_preview_loads_with_the_startup_sort_indicator(tmp_path, monkeypatch):
+    contacts = tmp_path / "contacts.csv"
+    contacts.write_text("Customers Name,Whatsapp Number,Message\nAlice,201000000001,Hi {name}\n", encoding="utf-8")
+    window = make_window(tmp_path, monkeypatch)
+    assert window.data_table.horizontalHeader().sortIndicatorSection() == -1
+
+    window.file_path.setText(str(contacts))
+    window.load_preview()
+    wait_for_queries(window)
+
+    model = window.contact_model
+    assert model.sort_column is None
+    assert model.rowCount() == 1
+    assert model.data(model.index(0, 2)) == "Hi Alice"
+
+
+def test_sorting_on_the_message_column_uses_the_rendered_text(tmp_path, monkeypatch):
+    contacts = tmp_path / "contacts.csv"
+    contacts.write_text("Customers Name,Whatsapp Number,Message\nbob,201000000001,Zzz {name}\n"
+                        "alice,201000000002,Aaa {name}\n", encoding="utf-8")
+    window = make_window(tmp_path, monkeypatch)
+    window.file_path.setText(str(contacts))
+    window.load_preview()
+    wait_for_queries(window)
+
+    window.data_table.sortByColumn(2, Qt.AscendingOrder)
+    wait_for_queries(window)
+    model = window.contact_model
+    assert [model.data(model.index(row, 2)) for row in range(2)] == ["Aaa alice", "Zzz bob"]
+
+    window.data_table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+    wait_for_queries(window)
+    assert model.sort_column is None
+    assert [model.data(model.index(row, 0)) for row in range(2)] == ["bob", "alice"]
@@ -0,0 +1,27 @@
+import pytest
+
+from phone_numbers import normalize_numbers, TOO_SHORT, TOO_LONG
+
+
+@pytest.mark.parametrize("country_code, number, expected", [
+    ("1", "2125551234", "12125551234"),
+    ("44", "7911123456", "447911123456"),
+    ("44", "07911123456", "447911123456"),
+    ("966", "0501234567", "966501234567"),
+    ("966", "966501234567", "966501234567"),
+    ("966", "+20 100 123 4567", "201001234567"),
+    ("966", "00201001234567", "201001234567"),
+])
+def test_local_numbers_get_the_country_code(country_code, number, expected):
+    result = normalize_numbers([number], country_code)
+    assert result["number"].tolist() == [expected]
+    assert result["reason"].tolist() == [""]
+
+
+@pytest.mark.parametrize("country_code, number, reason", [
+    ("966", "12345", TOO_SHORT),
+    ("966", "5012345678", TOO_LONG),
+    ("1", "212555123", TOO_SHORT),
+])
+def test_national_length_is_checked_after_the_code_is_added(country_code, number, reason):
+    assert normalize_numbers([number], country_code)["reason"].tolist() == [reason]
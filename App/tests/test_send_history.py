@@ -0,0 +1,21 @@
+from send_history import SendHistory, RECENTLY_MESSAGED, OPTED_OUT
+
+
+def test_recent_sends_are_loaded_once_per_campaign(tmp_path, monkeypatch):
+    history = SendHistory(str(tmp_path / "history.db"))
+    history.record_send("201000000001")
+    history.add_suppressions(["201000000002"])
+    queries = []
+    fetch = history._fetch_array
+    monkeypatch.setattr(history, "_fetch_array", lambda sql, params=(): queries.append(sql) or fetch(sql, params))
+
+    campaign = object()
+    for _ in range(3):
+        reasons = history.check(["201000000001", "201000000002", "201000000003"], 7, campaign)
+        assert reasons.tolist() == [RECENTLY_MESSAGED, OPTED_OUT, ""]
+    assert sum("FROM sends" in sql for sql in queries) == 1
+
+    history.check(["201000000001"], 7, object())
+    history.check(["201000000001"], 30, campaign)
+    assert sum("FROM sends" in sql for sql in queries) == 3
+    history.close()
@@ -0,0 +1,74 @@
+import time
+from collections import namedtuple
+
+from retry_queue import NO_SESSION
+from sender_pool import SenderPool
+from transport import Transport
+
+Contact = namedtuple("Contact", ["name", "number"])
+
+
+class CrashingTransport(Transport):
+    """Sends until crash_after messages went out, then the browser is gone for good."""
+
+    def __init__(self, crash_after):
+        self.crash_after = crash_after
+        self.sent = 0
+        self.connected = False
+
+    def connect(self, status):
+        if self.sent >= self.crash_after:
+            raise RuntimeError("Chrome is gone")
+        self.connected = True
+
+    def send(self, number, message, attachment=None):
+        if self.sent >= self.crash_after:
+            self.connected = False
+            raise RuntimeError("Chrome crashed")
+        self.sent += 1
+        return "sent"
+
+    def is_alive(self):
+        return self.connected
+
+
+def test_contacts_left_by_a_lost_session_are_reported():
+    results = []
+    pool = SenderPool([None], 0, on_result=results.append, transport_factory=lambda session: CrashingTransport(3))
+    contacts = [Contact(f"c{i}", f"2010000000{i:02d}") for i in range(20)]
+
+    finished = pool.run((contact, "hi") for contact in contacts)
+
+    assert not finished
+    assert pool.sessions_lost
+    assert pool.succeeded == 3
+    final = [result for result in results if result.retry_in is None]
+    assert len(final) == pool.completed
+    assert len({result.contact for result in final}) == len(final)
+    assert pool.abandoned and all(result.kind == NO_SESSION for result in final[-pool.abandoned:])
+
+
+def test_stop_is_not_a_lost_session():
+    pool = SenderPool([None], 0, transport_factory=lambda session: CrashingTransport(100))
+    pool.stop()
+
+    assert not pool.run((Contact("a", "201000000001"), "hi") for _ in range(5))
+    assert not pool.sessions_lost
+
+
+def test_results_are_reported_outside_the_pool_lock():
+    active = []
+    overlapped = []
+
+    def on_result(result):
+        active.append(result)
+        overlapped.append(len(active) > 1)
+        time.sleep(0.05)  # A slow journal or GUI update
+        active.remove(result)
+
+    pool = SenderPool([None] * 4, 0, on_result=on_result, transport_factory=lambda session: CrashingTransport(100))
+    contacts = [Contact(f"c{i}", f"2010000000{i:02d}") for i in range(20)]
+
+    assert pool.run((contact, "hi") for contact in contacts)
+    assert pool.succeeded == 20
+    assert any(overlapped)
@@ -0,0 +1,159 @@
+import random
+import threading
+import time
+from collections import namedtuple
+
+from selenium.common.exceptions import TimeoutException
+
+from page_events import PageEvents, InvalidNumberError
+from whatsapp_web import InPageSender, ChatNotOpenedError, open_chat_by_navigation, click_send
+
+# How WebTransport-style sessions drive Chrome: through chromedriver, or straight over DevTools
+SELENIUM = "selenium"
+DEVTOOLS = "devtools"
+ENGINES = (SELENIUM, DEVTOOLS)
+
+# A chat made ready by Transport.prepare(); handle is whatever the transport needs for the send click
+PreparedChat = namedtuple("PreparedChat", ["number", "message", "attachment", "handle"])
+
+
+class Transport:
+    """How one sending session delivers a message; SenderPool gives every worker its own.
+
+    send() returns "sent" or "queued" and raises like whatsapp_web does: InvalidNumberError,
+    ChatNotOpenedError / TimeoutException before anything was sent, DeliveryUnknownError after.
+    attachment is an attachments.Attachment sent with message as its caption, or None.
+    prepare() does everything before the send click, so the chat can load while the rate limiter
+    holds the click back; send_prepared() then clicks and confirms. max_prepared is how many
+    prepared chats the transport can hold at once, None for no limit.
+    """
+
+    max_prepared = None
+
+    def connect(self, status):
+        """Get ready to send; status is a callable(message, status_type) for progress messages."""
+
+    def send(self, number, message, attachment=None):
+        raise NotImplementedError
+
+    def prepare(self, number, message, attachment=None):
+        return PreparedChat(number, message, attachment, None)
+
+    def send_prepared(self, chat):
+        return self.send(chat.number, chat.message, chat.attachment)
+
+    def is_alive(self):
+        return True
+
+    def usage(self):
+        """browser_session.BrowserUsage of whatever this transport runs, or None."""
+        return None
+
+    def recycle(self, status):
+        """Replace whatever this transport runs with a fresh instance, between two sends."""
+        self.close()
+        self.connect(status)
+
+    def close(self):
+        pass
+
+
+class WebTransport(Transport):
+    """Sends through a SessionManager's WhatsApp Web driver (or a mock_server it points at)."""
+
+    max_prepared = 1  # One open chat per page, and WhatsApp Web allows one active tab per browser
+
+    def __init__(self, session, send_mode="navigate", metrics=None):
+        self.session = session
+        self.send_mode = send_mode
+        self.metrics = metrics
+        self.driver = None
+        self.events = None
+        self.in_page = None
+
+    def connect(self, status):
+        self.driver = self.session.get_driver(status)
+        self.events = PageEvents(self.driver)
+        self.in_page = InPageSender(self.driver, metrics=self.metrics) if self.send_mode == "in_page" else None
+
+    def send(self, number, message, attachment=None):
+        return self.send_prepared(self.prepare(number, message, attachment))
+
+    def prepare(self, number, message, attachment=None):
+        if self.in_page:
+            try:
+                return PreparedChat(number, message, attachment, self.in_page.prepare(number, message, attachment))
+            except ChatNotOpenedError:
+                pass  # Chat could not be opened in-page, fall back to a full page load
+        send_button = open_chat_by_navigation(self.driver, number, message, events=self.events,
+                                              base_url=self.session.base_url, metrics=self.metrics,
+                                              attachment=attachment)
+        return PreparedChat(number, message, attachment, send_button)
+
+    def send_prepared(self, chat):
+        return click_send(self.driver, self.events, chat.handle, metrics=self.metrics, attachment=chat.attachment)
+
+    def is_alive(self):
+        return self.session.is_alive()
+
+    def usage(self):
+        return self.session.usage()
+
+    def recycle(self, status):
+        # Quitting the driver keeps the log-in in the Chrome profile, so the new one starts headless
+        self.session.close()
+        self.connect(status)
+
+
+def browser_transport(session, send_mode="navigate", metrics=None, engine=SELENIUM):
+    """The Transport sending through a SessionManager's Chrome with the given engine."""
+    if engine == DEVTOOLS:
+        from cdp_engine import CdpTransport  # needs the optional websockets package
+        return CdpTransport(session, send_mode, metrics)
+    return WebTransport(session, send_mode, metrics)
+
+
+class MockTransport(Transport):
+    """In-process stand-in for WhatsApp Web, to measure the pipeline without a browser.
+
+    latency is the seconds a send takes (+/- jitter fraction), upload_latency what an attachment
+    adds; timeout_rate, invalid_rate and queued_rate inject the matching outcomes at random,
+    seeded so runs are repeatable.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, timeout_rate=0.0, invalid_rate=0.0, queued_rate=0.0, seed=None,
+                 upload_latency=0.0):
+        self.latency = latency
+        self.upload_latency = upload_latency
+        self.jitter = jitter
+        self.timeout_rate = timeout_rate
+        self.invalid_rate = invalid_rate
+        self.queued_rate = queued_rate
+        self.random = random.Random(seed)
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def send(self, number, message, attachment=None):
+        return self.send_prepared(self.prepare(number, message, attachment))
+
+    def prepare(self, number, message, attachment=None):
+        # The latency is the chat load; the outcome is decided here and delivered by send_prepared()
+        with self._lock:
+            roll = self.random.random()
+            latency = self.latency * (1 + self.random.uniform(-self.jitter, self.jitter)) if self.jitter else self.latency
+        if attachment:
+            latency += self.upload_latency
+        if latency > 0:
+            time.sleep(latency)
+        if roll < self.timeout_rate:
+            raise TimeoutException(f"Mock chat for {number} did not load")
+        roll -= self.timeout_rate
+        if roll < self.invalid_rate:
+            raise InvalidNumberError(f"{number} is not a valid WhatsApp number")
+        roll -= self.invalid_rate
+        return PreparedChat(number, message, attachment, "queued" if roll < self.queued_rate else "sent")
+
+    def send_prepared(self, chat):
+        with self._lock:
+            self.sent += 1
+        return chat.handle
@@ -0,0 +1,157 @@
+from urllib.parse import quote
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from attachments import DOCUMENT
+from page_events import PageEvents, InvalidNumberError
+from metrics import timed, NAVIGATE, OPEN_CHAT, CHAT_READY, ATTACH, CLICK, DELIVERY
+
+WHATSAPP_URL = 'https://web.whatsapp.com/'
+SEND_URL = '{base_url}send?phone={number}&text={text}'
+SEND_BUTTON_XPATH = '//span[@data-icon="send"]'
+
+# In-page selectors, kept together because WhatsApp Web changes them from time to time
+NEW_CHAT_XPATH = '//span[@data-icon="new-chat-outline" or @data-icon="chat"]'
+SEARCH_BOX_XPATH = '//div[@contenteditable="true"][@data-tab="3"]'
+SEARCH_RESULT_XPATH = '//div[@role="listitem"]//span[@title]'
+CHAT_TITLE_XPATH = '//div[@id="main"]//header//span[@dir="auto"]'
+COMPOSE_XPATH = '//div[@id="main"]//footer//div[@role="textbox"][@contenteditable="true"]'
+ATTACH_BUTTON_XPATH = ('//div[@id="main"]//footer//span[@data-icon="plus" or @data-icon="plus-rounded"'
+                       ' or @data-icon="attach-menu-plus" or @data-icon="clip"]')
+MEDIA_INPUT_XPATH = '//input[@type="file"][contains(@accept, "image")]'
+DOCUMENT_INPUT_XPATH = '//input[@type="file"][@accept="*"]'
+CAPTION_XPATH = '//div[@role="textbox"][@contenteditable="true"][not(ancestor::footer)][not(@data-tab="3")]'
+PREVIEW_SEND_XPATH = '//span[@data-icon="send" or @data-icon="wds-ic-send-filled"][not(ancestor::footer)]'
+
+# Replaces the content of a contenteditable the way a paste would, so WhatsApp's editor sees it
+INSERT_TEXT_JS = """
+const el = arguments[0];
+el.focus();
+document.execCommand('selectAll', false, null);
+document.execCommand('insertText', false, arguments[1]);
+"""
+
+
+def send_url(number, message, base_url=WHATSAPP_URL):
+    return SEND_URL.format(base_url=base_url, number=number, text=quote(message))
+
+
+class ChatNotOpenedError(Exception):
+    """The in-page flow failed before anything was sent, so the contact can safely be retried."""
+
+
+class DeliveryUnknownError(Exception):
+    """Waiting for the tick failed after the send click, so the message may or may not have gone out."""
+
+
+def confirm_delivery(events, timeout):
+    try:
+        return events.wait_delivery(timeout)
+    except Exception as e:
+        raise DeliveryUnknownError(str(e)) from e
+
+
+def attach(driver, attachment, caption, timeout):
+    """Hand an attachments.Attachment to the open chat's attach menu, with message as its caption.
+
+    Returns the preview's send button; nothing has been sent yet when this raises.
+    """
+    wait = WebDriverWait(driver, timeout, poll_frequency=0.1)
+    wait.until(EC.element_to_be_clickable((By.XPATH, ATTACH_BUTTON_XPATH))).click()
+    input_xpath = DOCUMENT_INPUT_XPATH if attachment.kind == DOCUMENT else MEDIA_INPUT_XPATH
+    wait.until(EC.presence_of_element_located((By.XPATH, input_xpath))).send_keys(attachment.path)
+    if caption:
+        caption_box = wait.until(EC.presence_of_element_located((By.XPATH, CAPTION_XPATH)))
+        driver.execute_script(INSERT_TEXT_JS, caption_box, caption)
+    return wait.until(EC.element_to_be_clickable((By.XPATH, PREVIEW_SEND_XPATH)))
+
+
+def open_chat_by_navigation(driver, number, message, timeout=15, events=None, base_url=WHATSAPP_URL, metrics=None,
+                            attachment=None):
+    """Open the chat through a full /send?phone= page load and fill it in, for sending with click_send.
+
+    Raises InvalidNumberError as soon as WhatsApp shows its invalid-number popup. With an
+    attachment, message is its caption. Returns the preview's send button when attaching, None
+    for a text message (its button is looked up at click time, so a re-render meanwhile cannot
+    leave it stale). Each phase is timed into metrics when given.
+    """
+    events = events or PageEvents(driver)
+    with timed(metrics, NAVIGATE):
+        driver.get(send_url(number, "" if attachment else message, base_url))
+    with timed(metrics, CHAT_READY):
+        events.wait_chat_ready(number, timeout, with_text=attachment is None)
+    if attachment:
+        with timed(metrics, ATTACH):
+            return attach(driver, attachment, message, timeout)
+    return None
+
+
+def click_send(driver, events, send_button=None, confirm_timeout=10, metrics=None, attachment=None,
+               upload_timeout=120):
+    """Click send in the open chat and wait for the tick.
+
+    Returns "sent" or "queued" (clock icon still showing after confirm_timeout) and raises
+    DeliveryUnknownError for failures after the click. With an attachment the tick is awaited
+    for up to upload_timeout, since leaving the page would cancel the upload.
+    """
+    with timed(metrics, CLICK):
+        events.mark_outgoing()
+        (send_button or driver.find_element(By.XPATH, SEND_BUTTON_XPATH)).click()
+    with timed(metrics, DELIVERY):
+        return confirm_delivery(events, upload_timeout if attachment else confirm_timeout)
+
+
+class InPageSender:
+    """Sends messages without reloading WhatsApp Web, by opening each chat from the new-chat search.
+
+    The chat header is checked against the number before anything is typed, so a search
+    that lands on the wrong chat (or on a saved contact shown by name) raises instead of
+    sending. Callers fall back to open_chat_by_navigation when prepare() raises
+    ChatNotOpenedError, and send the prepared chat with click_send either way.
+    """
+
+    def __init__(self, driver, timeout=5, metrics=None):
+        self.driver = driver
+        self.timeout = timeout
+        self.metrics = metrics
+        self.events = PageEvents(driver)
+
+    def _wait(self, condition):
+        return WebDriverWait(self.driver, self.timeout, poll_frequency=0.1).until(condition)
+
+    def _open_chat(self, number):
+        self._wait(EC.element_to_be_clickable((By.XPATH, NEW_CHAT_XPATH))).click()
+        search_box = self._wait(EC.presence_of_element_located((By.XPATH, SEARCH_BOX_XPATH)))
+        self.driver.execute_script(INSERT_TEXT_JS, search_box, number)
+
+        result = self._wait(EC.element_to_be_clickable((By.XPATH, SEARCH_RESULT_XPATH)))
+        result.click()
+
+        title = self._wait(EC.presence_of_element_located((By.XPATH, CHAT_TITLE_XPATH))).text
+        title_digits = "".join(ch for ch in title if ch.isdigit())
+        if title_digits != number:
+            raise LookupError(f"In-page search opened '{title}' instead of {number}")
+
+    def prepare(self, number, message, attachment=None):
+        """Open the chat and fill it in without sending; returns the send button for click_send.
+
+        Raises ChatNotOpenedError if the chat could not be opened in-page, InvalidNumberError if
+        WhatsApp says the number is not on it.
+        """
+        try:
+            with timed(self.metrics, OPEN_CHAT):
+                self._open_chat(number)
+                compose = self._wait(EC.presence_of_element_located((By.XPATH, COMPOSE_XPATH)))
+                if not attachment:
+                    self.driver.execute_script(INSERT_TEXT_JS, compose, message)
+            with timed(self.metrics, CHAT_READY):
+                self.events.wait_chat_ready(number, self.timeout, with_text=attachment is None)
+            if attachment:
+                with timed(self.metrics, ATTACH):
+                    return attach(self.driver, attachment, message, self.timeout)
+            return None
+        except InvalidNumberError:
+            raise
+        except Exception as e:
+            raise ChatNotOpenedError(str(e)) from e